@@ -8,16 +8,27 @@ from zoneinfo import ZoneInfo
 from contextlib import asynccontextmanager
 import asyncio
 import logging
+import time
 from parsers.conditionereParser import ConditionereParser
 from parsers.eurosantehParser import EurosantehParser
 from parsers.greeParser import GreeParser
 from parsers.jaraParser import JaraParser
 from parsers.termoformatParser import TermoformatParser
 from parsers.termocontrolParser import TermoControlParser
-from services.db import get_mongo_client
+from services.db import close_mongo, connect_mongo, get_mongo_client, get_mongo_pool_stats, shutdown_mongo_executor
 from services.mongodb_saver import MongoDBParserSaver
+from services.http_client import close_http_session, get_http_stats
+from services.http_cache import get_http_cache_stats
+from services.parse_pool import shutdown_parse_pool
+from services.http_archive import close_http_archive, flush_http_archive
+from services.catalog_publisher import get_catalog_collection, get_store_collections, is_versioned_catalog, publish_catalog
+from services.catalog_stats import backfill_numeric_fields, catalog_schema_outdated, refresh_catalog_stats
+from services.indexes import ensure_indexes, index_report
+from services.price_history import ensure_price_history, rollup_price_history
 from routers.products_router import router as products_router
 from routers.btu_router import router as btu_router
+from routers.stats_router import router as stats_router
+from routers.history_router import router as history_router
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
@@ -35,16 +46,24 @@ async def run_parser(parser_class, parser_name):
     global status_message
     try:
         status_message = f"Парсинг {parser_name} начался..."
+        started_at = time.perf_counter()
         parser = parser_class()
-        products = await parser.run()
 
-        if products:
-            db = get_mongo_client()
-            saver = MongoDBParserSaver(db)
-            saver.save_products(parser_name, products)
+        # Товары пишутся в БД пачками по мере обхода, без накопления всего каталога
+        db = get_mongo_client()
+        saver = MongoDBParserSaver(db)
+        stats = await saver.save_product_stream(parser_name, parser.iter_products(), started_at=started_at)
+
+        if stats["written"]:
             status_message = f"Парсинг {parser_name} завершён!"
+            first_write = (
+                f"Первая запись через {stats['first_write_latency']} с"
+                if stats["first_write_latency"] is not None else "Изменений для записи не было"
+            )
+            logging.info(f"[{parser_name}] {first_write}, весь обход и запись — {stats['total_latency']} с")
         else:
             status_message = f"{parser_name}: Нет новых данных."
+        return stats
     except Exception as e:
         status_message = f"Ошибка при парсинге {parser_name}: {e}"
         logging.error(f"[{parser_name}] Парсер упал с ошибкой: {e}", exc_info=True)
@@ -70,11 +89,31 @@ async def run_all_parsers():
         run_parser(TermoControlParser, "termocontrol"),
     ]
 
-    await asyncio.gather(*tasks)
+    results = await asyncio.gather(*tasks)
+    # Хвост пачки архива record иначе ждал бы остановки сервиса
+    await flush_http_archive()
+
+    if is_versioned_catalog():
+        # Читатели переключаются на новую версию каталога, только когда все магазины записаны
+        changed = any(
+            stats and (stats["inserted"] or stats["updated"] or stats["removed"]) for stats in results
+        )
+        try:
+            await asyncio.to_thread(publish_catalog, get_mongo_client(), changed)
+        except Exception as e:
+            logging.error(f"Не удалось опубликовать новую версию каталога: {e}", exc_info=True)
+
+    try:
+        await asyncio.to_thread(rollup_price_history, get_mongo_client())
+    except Exception as e:
+        logging.error(f"Не удалось обновить свёртки истории цен: {e}", exc_info=True)
 
     is_running = False
     status_message = f"Парсеры завершили работу в {get_local_time().strftime('%Y-%m-%d %H:%M:%S')}"
     logging.info(status_message)
+    logging.info(f"HTTP-статистика парсеров: {get_http_stats()}")
+    logging.info(f"Кэш страниц: {get_http_cache_stats()}")
+    logging.info(f"Пул MongoDB: {get_mongo_pool_stats()}")
 
 async def check_database():
     """Проверяем наличие всех коллекций перед запуском"""
@@ -88,7 +127,7 @@ async def check_database():
         "jara_products",
         "termoformat_products",
         "termocontrol_products",
-        "all_products"
+        get_catalog_collection(db).name
     }
 
     missing_collections = required_collections - existing_collections
@@ -99,22 +138,67 @@ async def check_database():
     else:
         logging.info("Все коллекции уже есть, первичный парсинг не требуется")
 
+def backfill_catalog():
+    """
+    Числовые поля товаров, сохранённых до их появления: без них фильтры API ничего
+    не находят до следующего обхода. Выполняется один раз — пока сводки каталога
+    нет или она собрана старой версией схемы.
+    """
+    try:
+        db = get_mongo_client()
+        catalog = get_catalog_collection(db)
+        if not catalog_schema_outdated(db, catalog):
+            return
+        collections = [db[name] for name in get_store_collections(db).values()] + [catalog]
+        for collection in collections:
+            updated = backfill_numeric_fields(collection)
+            if updated:
+                logging.info(f"{collection.name}: дописаны числовые поля {updated} товарам")
+        refresh_catalog_stats(db, catalog)
+    except Exception as e:
+        logging.error(f"Не удалось дописать числовые поля каталога: {e}", exc_info=True)
+
+def prepare_price_history():
+    """Создаёт коллекции истории цен и их свёрток (отдельно: time-series поддерживает не каждый сервер)."""
+    try:
+        ensure_price_history(get_mongo_client())
+    except Exception as e:
+        logging.error(f"Не удалось подготовить коллекции истории цен: {e}")
+
+def prepare_catalog_indexes():
+    """Создаёт недостающие индексы каталога и пишет в лог отчёт по индексам."""
+    try:
+        catalog = get_catalog_collection(get_mongo_client())
+        ensure_indexes(catalog)
+        report = index_report(catalog)
+        if report["missing"] or report["unused"]:
+            logging.warning(f"Индексы каталога: отсутствуют {report['missing']}, не используются {report['unused']}")
+        else:
+            logging.info(f"Индексы каталога {report['collection']} в порядке")
+    except Exception as e:
+        logging.error(f"Не удалось проверить индексы каталога: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global loop, scheduler_started
     loop = asyncio.get_running_loop()
     logging.info("FastAPI запущен вместе с планировщиком парсеров")
 
+    # Единственный клиент MongoDB на процесс: его пул используют парсеры, сохранение и API
+    connect_mongo()
     for _ in range(5):
         try:
             db = get_mongo_client()
-            db.command("ping")
+            await asyncio.to_thread(db.command, "ping")
             logging.info("Подключение к базе данных успешно")
             break
         except Exception as e:
             logging.error(f"Не удалось подключиться к базе данных: {e}")
             await asyncio.sleep(5)
 
+    await asyncio.to_thread(backfill_catalog)
+    await asyncio.to_thread(prepare_catalog_indexes)
+    await asyncio.to_thread(prepare_price_history)
     await check_database()
 
     if not scheduler_started:
@@ -130,12 +214,20 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    await close_http_session()
+    shutdown_parse_pool()
+    close_http_archive()
+    shutdown_mongo_executor()
+    close_mongo()
+
 app = FastAPI(lifespan=lifespan)
 
 scheduler = BackgroundScheduler(timezone="Europe/Chisinau")
 
 app.include_router(products_router)
 app.include_router(btu_router) 
+app.include_router(stats_router)
+app.include_router(history_router)
 
 @app.get("/", include_in_schema=False)
 async def root():
@@ -0,0 +1,108 @@
+"""
+Бенчмарк запросов каталога: снимок в памяти (services.catalog_index) против
+тех же фильтров в MongoDB. Каталог генерируется во временной базе
+(по умолчанию btu_benchmark), которая удаляется в конце:
+
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.catalog_index
+    python -m benchmarks.catalog_index --sizes 1000 5000 --repeat 500
+
+Для каждого запроса выводится медиана и 95-й перцентиль времени в миллисекундах
+и число найденных товаров; результаты обоих путей сверяются.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from pymongo import MongoClient
+
+from services.catalog_index import CatalogIndex
+from services.db import MONGO_URL
+from services.indexes import ensure_indexes
+from services.pagination import PageQuery
+
+BTU_VALUES = [7000, 9000, 12000, 18000, 24000, 36000]
+
+# Запрос эндпоинта: (поле, от, до)
+QUERIES = {
+    "/range/ 9000-12000": ("btu_value", 9000, 12000),
+    "/btu/12000": ("btu_value", 12000, 12000),
+    "/service_area/25": ("service_area_value", 20, 30),
+    "/price/ 5000-15000": ("price_value", 5000, 15000),
+}
+
+
+def make_products(count: int) -> list[dict]:
+    products = []
+    for i in range(count):
+        btu = random.choice(BTU_VALUES)
+        products.append({
+            "_id": f"store{i % 6}_https://example.com/product/{i}",
+            "name": f"Кондиционер {i}",
+            "url": f"https://example.com/product/{i}",
+            "btu_value": btu,
+            "price_value": random.randint(3000, 40000),
+            "service_area_value": btu // 350,
+            "source": f"store{i % 6}",
+        })
+    return products
+
+
+def percentile(samples: list[float], share: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * share))]
+
+
+def measure(func, repeat: int) -> dict:
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started_at) * 1000)
+    return {"p50": statistics.median(samples), "p95": percentile(samples, 0.95), "result": result}
+
+
+def run(sizes, repeat: int, database_name: str):
+    client = MongoClient(MONGO_URL)
+    collection = client[database_name]["all_products"]
+
+    try:
+        print(f"{'товаров':>8} {'запрос':<22} {'найдено':>8} {'mongo p50':>10} {'p95':>8} {'index p50':>10} {'p95':>8}")
+        for size in sizes:
+            collection.drop()
+            collection.insert_many(make_products(size))
+            ensure_indexes(collection)
+
+            started_at = time.perf_counter()
+            index = CatalogIndex(collection.name, list(collection.find({}, {"content_hash": 0})))
+            print(f"{size:>8} построение снимка: {round((time.perf_counter() - started_at) * 1000, 1)} мс")
+
+            for name, (field, low, high) in QUERIES.items():
+                page = PageQuery(field)
+                mongo = measure(
+                    lambda: list(collection.find({field: {"$gte": low, "$lte": high}}, sort=page.sort())), repeat
+                )
+                memory = measure(lambda: index.select(index.range(field, low, high), page), repeat)
+                if [doc["_id"] for doc in mongo["result"]] != [doc["_id"] for doc in memory["result"]]:
+                    print(f"{'':>8} ❌ {name}: результаты MongoDB и снимка различаются")
+                print(
+                    f"{size:>8} {name:<22} {len(memory['result']):>8} "
+                    f"{mongo['p50']:>10.3f} {mongo['p95']:>8.3f} {memory['p50']:>10.3f} {memory['p95']:>8.3f}"
+                )
+    finally:
+        client.drop_database(database_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Снимок каталога в памяти против запросов MongoDB")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000], help="размеры каталога")
+    parser.add_argument("--repeat", type=int, default=200, help="повторов каждого запроса")
+    parser.add_argument("--database", default="btu_benchmark", help="временная база для замеров")
+    args = parser.parse_args()
+    random.seed(42)
+    run(args.sizes, args.repeat, args.database)
+
+
+if __name__ == "__main__":
+    main()
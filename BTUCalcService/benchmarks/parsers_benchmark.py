@@ -0,0 +1,244 @@
+"""
+Микро-бенчмарк разбора HTML парсерами магазинов.
+
+Прогоняет extract_*-функции каждого парсера (разбор страницы каталога, номера
+последней страницы и страницы товара) на сохранённых HTML-фикстурах и считает
+страницы/сек, товары/сек и пик выделенной Python-памяти на страницу
+(tracemalloc не видит память внутри lexbor, только Python-объекты).
+
+Фикстуры лежат в benchmarks/fixtures/<магазин>/<list|product>/*.html. В репозитории
+— небольшие синтетические страницы с той же разметкой, что ищут селекторы парсеров,
+и эталон для них (benchmarks/parsers_baseline.json). Реальные страницы можно
+выгрузить из архива, записанного парсерами в режиме PARSER_HTTP_MODE=record,
+и пересохранить эталон:
+
+    python -m benchmarks.parsers_benchmark --export-fixtures http_archive.db
+    python -m benchmarks.parsers_benchmark --save-baseline
+    python -m benchmarks.parsers_benchmark --check
+
+С --check скрипт завершается с кодом 1, если скорость упала или память выросла
+больше допустимого (--tolerance) относительно benchmarks/parsers_baseline.json.
+Бенчмарки без фикстур или без записи в эталоне пропускаются (с сообщением).
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+
+from parsers.conditionereParser import ConditionereParser
+from parsers.eurosantehParser import EurosantehParser
+from parsers.greeParser import GreeParser
+from parsers.jaraParser import JaraParser
+from parsers.termocontrolParser import TermoControlParser
+from parsers.termoformatParser import TermoformatParser
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = BENCHMARKS_DIR / "fixtures"
+BASELINE_PATH = BENCHMARKS_DIR / "parsers_baseline.json"
+
+
+def _products_of(result):
+    """extract_list_page возвращает либо список товаров, либо (товары, ...)."""
+    if isinstance(result, tuple):
+        result = result[0]
+    return len(result) if result else 0
+
+
+# Для каждого магазина: признак страницы каталога по url и функции разбора по видам страниц
+STORES = {
+    "conditionere": {
+        "list_prefixes": (ConditionereParser.start_url,),
+        "list": lambda html: ConditionereParser.extract_list_page(html, ConditionereParser.base_url),
+    },
+    "eurosanteh": {
+        "list_prefixes": ("https://eurosanteh.md/ru/nastennye-kondicionery-split-sistemy/",),
+        "list": lambda html: EurosantehParser.extract_list_page(html, EurosantehParser.base_url),
+    },
+    "gree": {
+        "list_prefixes": (GreeParser.base_url,),
+        "list": GreeParser.extract_products,
+    },
+    "jara": {
+        "list_prefixes": (JaraParser.base_url,),
+        "list": JaraParser.extract_list_page,
+        "last_page": JaraParser.extract_last_page_number,
+        "product": lambda html: JaraParser.extract_product_page(html, {"url": ""}),
+    },
+    "termocontrol": {
+        "list_prefixes": (TermoControlParser.base_url,),
+        "list": TermoControlParser.extract_list_page,
+        "product": lambda html: TermoControlParser.extract_product_page(html, {"url": ""}),
+    },
+    "termoformat": {
+        "list_prefixes": (TermoformatParser.base_url + "/ru/kondicioneri/split_sistemi/",),
+        "list": lambda html: TermoformatParser.extract_list_page(html, TermoformatParser.base_url),
+        "product": lambda html: TermoformatParser.extract_product_page(html, {"url": ""}),
+    },
+}
+
+# Какие фикстуры использует каждый вид разбора
+FIXTURE_KIND = {"list": "list", "last_page": "list", "product": "product"}
+
+
+def _store_of(url: str):
+    for store, spec in STORES.items():
+        host = spec["list_prefixes"][0].split("/")[2]
+        if url.split("/")[2:3] == [host]:
+            kind = "list" if url.startswith(spec["list_prefixes"]) else "product"
+            return store, kind
+    return None, None
+
+
+def export_fixtures(archive_path: str, limit: int):
+    """Выгружает успешные ответы из архива record/replay в файлы фикстур."""
+    connection = sqlite3.connect(archive_path)
+    counters = {}
+    for url, body in connection.execute("SELECT url, body FROM responses WHERE status = 200 ORDER BY url"):
+        store, kind = _store_of(url)
+        if not store or (kind == "product" and "product" not in STORES[store]):
+            continue
+
+        index = counters.get((store, kind), 0)
+        if index >= limit:
+            continue
+        counters[(store, kind)] = index + 1
+
+        target = FIXTURES_DIR / store / kind / f"{index:03d}.html"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(zlib.decompress(body).decode("utf-8"), encoding="utf-8")
+    connection.close()
+
+    for (store, kind), count in sorted(counters.items()):
+        print(f"{store:<13} {kind:<8} {count} страниц")
+
+
+def _load_fixtures(store: str, kind: str) -> list[str]:
+    directory = FIXTURES_DIR / store / kind
+    return [path.read_text(encoding="utf-8") for path in sorted(directory.glob("*.html"))]
+
+
+# Минимальная длительность одного прогона, чтобы замер не тонул в шуме таймера
+MIN_ROUND_SECONDS = 0.2
+
+
+def bench(func, pages: list[str], rounds: int, counts_products: bool = True) -> dict:
+    def one_pass():
+        count = 0
+        for html in pages:
+            result = func(html)
+            if counts_products:
+                count += _products_of(result)
+        return count
+
+    # Прогрев и подбор числа повторов на прогон
+    started = time.perf_counter()
+    products = one_pass()
+    repeat = max(1, int(MIN_ROUND_SECONDS / max(time.perf_counter() - started, 1e-6)))
+
+    # Время — лучший из нескольких прогонов, в пересчёте на один проход по страницам
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            one_pass()
+        best = min(best, (time.perf_counter() - started) / repeat)
+
+    # Память — отдельным прогоном, так как tracemalloc сильно замедляет выполнение
+    tracemalloc.start()
+    peaks = []
+    for html in pages:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func(html)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    return {
+        "pages": len(pages),
+        "pages_per_sec": round(len(pages) / best, 1),
+        "products_per_sec": round(products / best, 1) if products else None,
+        "peak_kb_per_page": round(sum(peaks) / len(peaks) / 1024, 1),
+    }
+
+
+def run_benchmarks(rounds: int) -> dict:
+    results = {}
+    for store, spec in STORES.items():
+        for name, kind in FIXTURE_KIND.items():
+            if name not in spec:
+                continue
+            pages = _load_fixtures(store, kind)
+            if not pages:
+                print(f"⏭️ {store}.{name}: нет фикстур в {FIXTURES_DIR / store / kind}, пропуск")
+                continue
+            # Страница товара и номер последней страницы товаров не содержат — считаем только страницы
+            results[f"{store}.{name}"] = bench(spec[name], pages, rounds, counts_products=(name == "list"))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            print(f"⏭️ {key}: нет в эталоне, сравнение пропущено")
+            continue
+        if current["pages_per_sec"] < previous["pages_per_sec"] * (1 - tolerance):
+            regressions.append(f"{key}: {previous['pages_per_sec']} → {current['pages_per_sec']} страниц/сек")
+        if current["peak_kb_per_page"] > previous["peak_kb_per_page"] * (1 + tolerance):
+            regressions.append(f"{key}: {previous['peak_kb_per_page']} → {current['peak_kb_per_page']} КБ/страницу")
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк разбора HTML парсерами магазинов")
+    arg_parser.add_argument("--export-fixtures", metavar="ARCHIVE", help="выгрузить фикстуры из архива record/replay")
+    arg_parser.add_argument("--limit", type=int, default=20, help="сколько страниц каждого вида выгружать")
+    arg_parser.add_argument("--rounds", type=int, default=5, help="число прогонов для замера времени")
+    arg_parser.add_argument("--save-baseline", action="store_true", help="сохранить результаты как эталон")
+    arg_parser.add_argument("--check", action="store_true", help="сравнить с эталоном и упасть при регрессии")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое ухудшение (доля)")
+    args = arg_parser.parse_args()
+
+    if args.export_fixtures:
+        export_fixtures(args.export_fixtures, args.limit)
+        return 0
+
+    results = run_benchmarks(args.rounds)
+    if not results:
+        print(f"⏭️ Нет фикстур в {FIXTURES_DIR}, бенчмарк пропущен. Их можно выгрузить: --export-fixtures <архив>.")
+        return 0
+
+    print(f"{'бенчмарк':<26}{'страниц':>8}{'стр/с':>10}{'товаров/с':>12}{'КБ/стр':>9}")
+    for key, result in results.items():
+        print(
+            f"{key:<26}{result['pages']:>8}{result['pages_per_sec']:>10}"
+            f"{result['products_per_sec'] or '-':>12}{result['peak_kb_per_page']:>9}"
+        )
+
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Эталон сохранён в {BASELINE_PATH}")
+
+    if args.check:
+        if not BASELINE_PATH.exists():
+            print(f"⏭️ Эталон {BASELINE_PATH} не найден, проверка пропущена. Сохраните его: --save-baseline.")
+            return 0
+        regressions = compare(results, json.loads(BASELINE_PATH.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print("Регрессии производительности:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("Регрессий нет.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Бенчмарк записи каталога в MongoDB: сколько обращений к серверу делает одно
+сохранение и как это число зависит от размера каталога.
+
+Команды считаются через pymongo CommandListener (каждая команда — один
+round-trip), поэтому цифры не зависят от скорости сети. Запись идёт в
+отдельную базу (по умолчанию btu_benchmark), которая удаляется в конце:
+
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.saver_roundtrips
+    python -m benchmarks.saver_roundtrips --sizes 100 1000 5000
+
+Для каждого размера каталога сохраняются две версии: сначала первичная
+загрузка, затем каталог с изменёнными ценами (путь обновления).
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from pymongo import MongoClient, monitoring
+
+from services.db import MONGO_URL
+from services.mongodb_saver import MongoDBParserSaver
+
+STORE = "benchmark"
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Считает отправленные на сервер команды по имени."""
+
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands.clear()
+
+    @property
+    def total(self) -> int:
+        return sum(self.commands.values())
+
+
+def make_products(count: int, version: int) -> list[dict]:
+    return [
+        {
+            "name": f"Кондиционер {i}",
+            "price": 10000 + i + version,
+            "currency": "MDL",
+            "btu": 9000 + (i % 4) * 3000,
+            "service_area": 25 + i % 40,
+            "store": STORE,
+            "url": f"https://example.md/product/{i}",
+        }
+        for i in range(count)
+    ]
+
+
+async def as_stream(products):
+    for product in products:
+        yield product
+
+
+def measure(counter: CommandCounter, save) -> dict:
+    counter.reset()
+    started = time.perf_counter()
+    save()
+    return {
+        "round_trips": counter.total,
+        "seconds": round(time.perf_counter() - started, 3),
+        "commands": dict(counter.commands),
+    }
+
+
+def run(sizes, database_name: str):
+    counter = CommandCounter()
+    client = MongoClient(MONGO_URL, event_listeners=[counter])
+    db = client[database_name]
+    saver = MongoDBParserSaver(db)
+
+    modes = {
+        "save_products": lambda products: saver.save_products(STORE, products),
+        "save_product_stream": lambda products: asyncio.run(
+            saver.save_product_stream(STORE, as_stream(products))
+        ),
+    }
+
+    try:
+        for mode, save in modes.items():
+            print(f"\n{mode}")
+            print(f"{'товаров':>8} {'шаг':>10} {'round-trips':>12} {'сек':>8}  команды")
+            for size in sizes:
+                client.drop_database(database_name)
+                for step, version in (("загрузка", 0), ("обновление", 1)):
+                    products = make_products(size, version)
+                    result = measure(counter, lambda: save(products))
+                    commands = ", ".join(f"{name}={count}" for name, count in sorted(result["commands"].items()))
+                    print(f"{size:>8} {step:>10} {result['round_trips']:>12} {result['seconds']:>8}  {commands}")
+    finally:
+        client.drop_database(database_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Число обращений к MongoDB при сохранении каталога")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="размеры каталога")
+    parser.add_argument("--database", default="btu_benchmark", help="временная база для замеров")
+    args = parser.parse_args()
+    run(args.sizes, args.database)
+
+
+if __name__ == "__main__":
+    main()
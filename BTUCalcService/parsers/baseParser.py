@@ -0,0 +1,323 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import aiohttp
+from collections import deque
+from services.db import get_mongo_client
+from services.http_archive import ArchiveMiss, flush_http_archive, get_http_archive, is_replay_mode
+from services.http_cache import get_http_cache_async
+from services.rate_limiter import RATE_LIMIT_MAX_CONCURRENCY, get_host_limiter, parse_retry_after
+
+_DONE = object()
+
+# Инкрементальный обход: детальные страницы грузим только для новых и изменённых товаров
+PARSER_INCREMENTAL = os.getenv("PARSER_INCREMENTAL", "1") == "1"
+# Остальные товары обновляются по кругу: за один запуск — примерно 1/PARSER_REFRESH_SLOTS часть
+PARSER_REFRESH_SLOTS = int(os.getenv("PARSER_REFRESH_SLOTS", "24"))
+# Повторы при 429/5xx/тайм-аутах и базовая пауза экспоненциальной задержки (сек)
+PARSER_MAX_RETRIES = int(os.getenv("PARSER_MAX_RETRIES", "3"))
+PARSER_RETRY_BACKOFF = float(os.getenv("PARSER_RETRY_BACKOFF", "1"))
+
+# Ошибки соединения, после которых запрос имеет смысл повторить
+RETRYABLE_ERRORS = (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+
+
+class BaseParser:
+    """Общая основа парсеров: запрос страниц и ограниченный параллельный обход."""
+
+    store_name = None
+    # Верхняя граница одновременных запросов к магазину. Фактическое число подбирает
+    # ограничитель хоста; окно задач map_ordered равно этой границе, чтобы не сдерживать его
+    max_concurrency = RATE_LIMIT_MAX_CONCURRENCY
+    # Поля карточки в каталоге, по которым видно, что товар изменился
+    listing_fields = ("name", "price")
+    incremental = PARSER_INCREMENTAL
+    refresh_slots = PARSER_REFRESH_SLOTS
+    max_retries = PARSER_MAX_RETRIES
+
+    def __init__(self, max_concurrency=None):
+        if max_concurrency:
+            self.max_concurrency = max_concurrency
+
+    async def request(self, session, url):
+        """
+        Единая точка запроса страниц: возвращает (статус, текст).
+        В режиме replay ответ берётся из архива без сети (url не из архива —
+        ArchiveMiss), в режиме record каждый полученный ответ дополнительно
+        сохраняется в архив.
+        """
+        archive = get_http_archive()
+        if archive and is_replay_mode():
+            return await archive.replay(url)
+
+        status, text = await self.request_live(session, url)
+        if archive:
+            await archive.record(url, status, text)
+        return status, text
+
+    async def request_live(self, session, url):
+        """
+        GET-запрос с ограничением скорости по хосту и повторами: возвращает (статус, текст).
+        429, 5xx и тайм-ауты повторяются с экспоненциальной задержкой (или по Retry-After)
+        и заставляют ограничитель хоста сбавить темп; успешные ответы его постепенно повышают.
+        """
+        limiter = get_host_limiter(url, self.max_concurrency)
+
+        for attempt in range(self.max_retries + 1):
+            is_last_attempt = attempt == self.max_retries
+            try:
+                async with limiter.slot():
+                    status, text, headers = await self.conditional_get(session, url)
+            except RETRYABLE_ERRORS as e:
+                limiter.on_throttle()
+                if is_last_attempt:
+                    raise
+                print(f"[ПОВТОР] {url}: {type(e).__name__}, попытка {attempt + 2}/{self.max_retries + 1}")
+                await asyncio.sleep(self.backoff_delay(attempt))
+                continue
+
+            if status == 429 or status >= 500:
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+                limiter.on_throttle(retry_after)
+                if is_last_attempt:
+                    return status, text
+                print(f"[ПОВТОР] {url}: статус {status}, попытка {attempt + 2}/{self.max_retries + 1}")
+                # При Retry-After паузу выдерживает ограничитель хоста
+                if retry_after is None:
+                    await asyncio.sleep(self.backoff_delay(attempt))
+                continue
+
+            limiter.on_success()
+            return status, text
+
+    @staticmethod
+    def backoff_delay(attempt):
+        """Экспоненциальная задержка со случайным разбросом, чтобы повторы не шли залпом."""
+        return PARSER_RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    async def conditional_get(self, session, url):
+        """
+        GET-запрос через дисковый кэш страниц: возвращает (статус, текст, заголовки).
+        Если есть сохранённая копия, запрос отправляется условным, и ответ 304
+        отдаётся из кэша как обычный 200. Диск кэша читается и пишется в потоках.
+        """
+        cache = await get_http_cache_async()
+        validators = await asyncio.to_thread(cache.validators, url) if cache else {}
+
+        async with session.get(url, headers=validators) as response:
+            if response.status == 304 and cache:
+                text = await asyncio.to_thread(cache.load, url)
+                if text is not None:
+                    return 200, text, response.headers
+                # Локальная копия пропала — повторяем запрос без валидаторов
+                await asyncio.to_thread(cache.forget, url)
+                return await self.conditional_get(session, url)
+
+            text = await response.text()
+            if response.status == 200 and cache:
+                await asyncio.to_thread(cache.store, url, text, response.headers, bool(validators))
+            return response.status, text, response.headers
+
+    async def fetch(self, session, url):
+        """Функция запроса страницы с таймаутом и обработкой ошибок."""
+        try:
+            status, text = await self.request(session, url)
+            if status != 200:
+                print(f"[ОШИБКА] Ошибка запроса {url}: {status}")
+                return None
+            return text
+        except ArchiveMiss:
+            print(f"[REPLAY] Нет ответа в архиве для {url}")
+        except asyncio.TimeoutError:
+            print(f"[ОШИБКА] Тайм-аут при запросе {url}")
+        except aiohttp.ClientError as e:
+            print(f"[ОШИБКА] Сетевая ошибка при запросе {url}: {e}")
+        except Exception as e:
+            print(f"[ОШИБКА] Неизвестная ошибка при запросе {url}: {e}")
+        return None
+
+    async def map_ordered(self, items, worker, concurrency=None):
+        """
+        Выполняет worker(item) параллельно, но не более concurrency задач одновременно,
+        и отдаёт результаты в исходном порядке элементов.
+        Ошибка одного элемента не прерывает обход: вместо результата отдаётся None.
+        """
+        limit = concurrency or self.max_concurrency
+        semaphore = asyncio.Semaphore(limit)
+
+        async def guarded(index, item):
+            async with semaphore:
+                try:
+                    return await worker(item)
+                except Exception as e:
+                    print(f"[ОШИБКА] [{self.store_name}] Ошибка обработки элемента #{index}: {e}")
+                    return None
+
+        # Держим небольшое окно задач впереди, чтобы не создавать тысячи задач сразу
+        window = limit * 2
+        pending = deque()
+        iterator = enumerate(items, start=1)
+        try:
+            while True:
+                while len(pending) < window:
+                    entry = next(iterator, _DONE)
+                    if entry is _DONE:
+                        break
+                    pending.append(asyncio.ensure_future(guarded(*entry)))
+
+                if not pending:
+                    break
+
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_pages(self, session, urls):
+        """Параллельно загружает страницы каталога и отдаёт пары (url, html) в порядке urls."""
+        async def load(url):
+            print(f"Парсим страницу: {url}")
+            return url, await self.fetch(session, url)
+
+        async for result in self.map_ordered(list(urls), load):
+            if result:
+                yield result
+
+    async def iter_linked_pages(self, session, start_url, parse_page, guess_url, prefetch=None):
+        """
+        Обход каталога по ссылкам «следующая страница» с упреждающей загрузкой.
+        parse_page(html, page) возвращает (товары, url следующей страницы),
+        guess_url(page) предсказывает адрес страницы по номеру. Следующие prefetch
+        страниц (по умолчанию — текущее окно ограничителя хоста) загружаются заранее;
+        если предсказание не совпало со ссылкой, упреждение отключается и обход
+        продолжается последовательно.
+        """
+        depth = int(get_host_limiter(start_url, self.max_concurrency).concurrency) if prefetch is None else prefetch
+        pending = {}
+        url, page = start_url, 1
+
+        try:
+            while url:
+                print(f"Парсим страницу: {url}")
+                task = pending.pop(url, None)
+                html = await task if task else await self.fetch(session, url)
+                if not html:
+                    print(f"Страница {url} не загружена. Заканчиваем обход каталога.")
+                    break
+
+                page_products, next_url = await parse_page(html, page)
+                yield page_products
+                page += 1
+
+                if depth and next_url and next_url != guess_url(page):
+                    print(f"[{self.store_name}] Адрес следующей страницы не совпал с предсказанным, упреждение отключено.")
+                    depth = 0
+
+                # Держим в полёте только страницы из окна [page, page + depth)
+                window = {guess_url(ahead) for ahead in range(page, page + depth)} if next_url else set()
+                for stale_url in [u for u in pending if u not in window]:
+                    pending.pop(stale_url).cancel()
+                for ahead_url in window:
+                    if ahead_url not in pending:
+                        pending[ahead_url] = asyncio.ensure_future(self.fetch(session, ahead_url))
+
+                url = next_url
+        finally:
+            for task in pending.values():
+                task.cancel()
+
+    def listing_signature(self, product):
+        """Отпечаток данных товара из каталога (до перехода на его страницу)."""
+        listing = {field: product.get(field) for field in self.listing_fields}
+        data = json.dumps(listing, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    def in_refresh_slot(self, url):
+        """Попадает ли товар в часть каталога, которая перепроверяется в этот час."""
+        if self.refresh_slots <= 1:
+            return True
+        url_slot = int(hashlib.sha1(url.encode()).hexdigest()[:8], 16) % self.refresh_slots
+        return url_slot == int(time.time() // 3600) % self.refresh_slots
+
+    async def load_stored_products(self):
+        """Сохранённые товары магазина из <store>_products, по url."""
+        def query():
+            collection = get_mongo_client()[f"{self.store_name}_products"]
+            return {
+                doc["_id"]: doc
+                for doc in collection.find({"_id": {"$ne": "metadata"}}, {"updated_at": 0})
+            }
+
+        try:
+            return await asyncio.to_thread(query)
+        except Exception as e:
+            print(f"[ОШИБКА] [{self.store_name}] Не удалось загрузить сохранённые товары, полный обход: {e}")
+            return {}
+
+    async def resolve_product(self, session, product, stored_products, counters):
+        """Берёт данные товара из БД, если карточка в каталоге не изменилась, иначе парсит страницу."""
+        product["listing_signature"] = self.listing_signature(product)
+        stored = stored_products.get(product["url"])
+
+        if (
+            stored
+            and stored.get("listing_signature") == product["listing_signature"]
+            and not self.in_refresh_slot(product["url"])
+        ):
+            counters["reused"] += 1
+            return {key: value for key, value in stored.items() if key != "_id"}
+
+        counters["fetched"] += 1
+        return await self.parse_product_page(session, product)
+
+    async def iter_details(self, session, products):
+        """
+        Параллельно загружает детальные страницы товаров и отдаёт их в порядке списка.
+        В инкрементальном режиме неизменившиеся товары берутся из БД.
+        В режиме replay обход всегда полный: иначе результат зависел бы от часа
+        запуска (in_refresh_slot) и содержимого БД, а не только от архива.
+        """
+        detailed_count = 0
+        total = len(products)
+
+        incremental = self.incremental and not is_replay_mode()
+        stored_products = await self.load_stored_products() if incremental else {}
+        counters = {"fetched": 0, "reused": 0}
+
+        position = 0
+        async for detailed_product in self.map_ordered(
+            products, lambda product: self.resolve_product(session, product, stored_products, counters)
+        ):
+            position += 1
+            if detailed_product:
+                detailed_count += 1
+                yield detailed_product
+                print(
+                    f"[{position}/{total}] {detailed_product['name']} – {detailed_product['price']} {detailed_product['currency']} | "
+                    f"BTU: {detailed_product['btu']} | Площадь: {detailed_product['service_area']} | Магазин: {detailed_product['store']} | URL: {detailed_product['url']}"
+                )
+
+        print(f"\n[{self.store_name}] Собрано детально {detailed_count} товаров")
+        if incremental:
+            print(
+                f"[{self.store_name}] Детальных страниц загружено: {counters['fetched']}, "
+                f"взято из БД без изменений: {counters['reused']}"
+            )
+
+    async def parse_product_page(self, session, product):
+        raise NotImplementedError
+
+    async def iter_products(self):
+        """Асинхронный поток товаров магазина; реализуется в каждом парсере."""
+        raise NotImplementedError
+        yield
+
+    async def run(self):
+        """Собирает все товары в список (для отдельного запуска парсера)."""
+        try:
+            return [product async for product in self.iter_products()]
+        finally:
+            await flush_http_archive()
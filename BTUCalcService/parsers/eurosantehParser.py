@@ -1,26 +1,23 @@
 import asyncio
-import aiohttp
 from selectolax.parser import HTMLParser
+from parsers.baseParser import BaseParser
 from services.db import get_mongo_client
+from services.http_archive import close_http_archive
+from services.http_client import http_session, close_http_session
+from services.parse_pool import run_in_parse_pool
 from services.mongodb_saver import MongoDBParserSaver
 
 
-class EurosantehParser:
+class EurosantehParser(BaseParser):
+    store_name = "eurosanteh"
     base_url = "https://eurosanteh.md"
     start_url = "https://eurosanteh.md/ru/nastennye-kondicionery-split-sistemy/?page=1"
 
-    async def fetch(self, session, url):
-        try:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    print(f"[ОШИБКА] Ошибка запроса {url}: {response.status}")
-                    return None
-                return await response.text()
-        except Exception as e:
-            print(f"[ОШИБКА] Ошибка запроса {url}: {e}")
-            return None
-
     async def parse_list_page(self, html):
+        return await run_in_parse_pool(self.extract_list_page, html, self.base_url)
+
+    @staticmethod
+    def extract_list_page(html, base_url):
         tree = HTMLParser(html)
         products = []
 
@@ -32,7 +29,7 @@ class EurosantehParser:
                 if not name_element:
                     continue
 
-                url = self.base_url + name_element.attributes.get("href")
+                url = base_url + name_element.attributes.get("href")
                 name = name_element.text(strip=True)
 
                 # BTU и Площадь
@@ -98,46 +95,55 @@ class EurosantehParser:
 
         return products, last_page_number
 
-    async def run(self):
-        products = []
+    async def iter_products(self):
+        """Отдаёт товары постранично, по мере загрузки каталога."""
+        count = 0
 
-        async with aiohttp.ClientSession() as session:
+        async with http_session() as session:
             print(f"Парсим страницу: {self.start_url}")
             first_page_html = await self.fetch(session, self.start_url)
 
             if not first_page_html:
                 print("[ОШИБКА] Не удалось загрузить первую страницу")
-                return []
+                return
 
             first_page_products, last_page_number = await self.parse_list_page(first_page_html)
-            products.extend(first_page_products)
+            for product in first_page_products:
+                count += 1
+                yield product
 
             print(f"Определено страниц: {last_page_number}")
 
-            # Парсим оставшиеся страницы
-            for page in range(2, last_page_number + 1):
-                page_url = f"https://eurosanteh.md/ru/nastennye-kondicionery-split-sistemy/?page={page}"
-                print(f"Парсим страницу: {page_url}")
-
-                html = await self.fetch(session, page_url)
+            # Оставшиеся страницы загружаем параллельно, сохраняя порядок
+            page_urls = [
+                f"https://eurosanteh.md/ru/nastennye-kondicionery-split-sistemy/?page={page}"
+                for page in range(2, last_page_number + 1)
+            ]
+            async for page_url, html in self.iter_pages(session, page_urls):
                 if not html:
                     print(f"[ОШИБКА] Не удалось загрузить страницу {page_url}")
                     continue
 
                 try:
                     page_products, _ = await self.parse_list_page(html)
-                    products.extend(page_products)
                 except Exception as e:
                     print(f"[ОШИБКА] Ошибка обработки страницы {page_url}: {e}")
+                    continue
 
-            print(f"Собрано {len(products)} товаров")
+                for product in page_products:
+                    count += 1
+                    yield product
 
-            return products
+            print(f"Собрано {count} товаров")
 
 
 async def main():
     parser = EurosantehParser()
-    results = await parser.run()
+    try:
+        results = await parser.run()
+    finally:
+        await close_http_session()
+        close_http_archive()
 
     db = get_mongo_client()
     saver = MongoDBParserSaver(db)
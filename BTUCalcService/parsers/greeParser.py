@@ -1,27 +1,26 @@
 import asyncio
-import aiohttp
 from selectolax.parser import HTMLParser
+from parsers.baseParser import BaseParser
 from services.db import get_mongo_client
+from services.http_archive import close_http_archive
+from services.http_client import http_session, close_http_session
+from services.parse_pool import run_in_parse_pool
 from services.mongodb_saver import MongoDBParserSaver
 
 
-class GreeParser:
+class GreeParser(BaseParser):
+    store_name = "gree"
     base_url = "https://gree.com.md/ru/"
 
-    async def fetch(self, session, url):
-        """Запрашиваем страницу."""
-        try:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    print(f"[ОШИБКА] Ошибка запроса {url}: {response.status}")
-                    return None
-                return await response.text()
-        except Exception as e:
-            print(f"[ОШИБКА] Ошибка запроса {url}: {e}")
-            return None
-
     async def parse_products(self, html):
         """Парсим страницу и собираем товары."""
+        products = await run_in_parse_pool(self.extract_products, html)
+        if not products:
+            print(f"[ПРЕДУПРЕЖДЕНИЕ] На {self.base_url} не найдено товаров.")
+        return products
+
+    @staticmethod
+    def extract_products(html):
         tree = HTMLParser(html)
         products = []
 
@@ -82,30 +81,32 @@ class GreeParser:
             except Exception as e:
                 print(f"[ОШИБКА] Ошибка при парсинге товара: {e}")
 
-        if not products:
-            print(f"[ПРЕДУПРЕЖДЕНИЕ] На {self.base_url} не найдено товаров.")
-
         return products
 
-    async def run(self):
-        """Главная функция парсинга."""
-        async with aiohttp.ClientSession() as session:
+    async def iter_products(self):
+        """Главная функция парсинга: отдаёт товары по мере готовности."""
+        async with http_session() as session:
             print(f"Парсим страницу: {self.base_url}")
             html = await self.fetch(session, self.base_url)
 
             if html is None:
                 print(f"[ОШИБКА] Ошибка загрузки {self.base_url}")
-                return []
+                return
 
             products = await self.parse_products(html)
 
             print(f"Собрано {len(products)} товаров")
-            return products
+            for product in products:
+                yield product
 
 
 async def main():
     parser = GreeParser()
-    results = await parser.run()
+    try:
+        results = await parser.run()
+    finally:
+        await close_http_session()
+        close_http_archive()
 
     db = get_mongo_client()
     saver = MongoDBParserSaver(db)
@@ -1,25 +1,33 @@
 import asyncio
-import aiohttp
 from selectolax.parser import HTMLParser
+from parsers.baseParser import BaseParser
 from services.db import get_mongo_client
+from services.http_archive import close_http_archive
+from services.http_client import http_session, close_http_session
+from services.parse_pool import run_in_parse_pool
 from services.mongodb_saver import MongoDBParserSaver
 
 
-class JaraParser:
+class JaraParser(BaseParser):
+    store_name = "jara"
     base_url = "https://jara.md/ru/bytovye-kondicionery/?page="
 
-    async def fetch(self, session, url):
-        try:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    print(f"[ОШИБКА] Ошибка запроса {url}: {response.status}")
-                    return None
-                return await response.text()
-        except Exception as e:
-            print(f"[ОШИБКА] Ошибка запроса {url}: {e}")
+    async def get_last_page_number(self, html):
+        return await run_in_parse_pool(self.extract_last_page_number, html)
+
+    async def parse_list_page(self, html):
+        return await run_in_parse_pool(self.extract_list_page, html)
+
+    async def parse_product_page(self, session, product):
+        html = await self.fetch(session, product["url"])
+        if not html:
+            print(f"[ОШИБКА] Не удалось загрузить страницу товара {product['url']}")
             return None
 
-    async def get_last_page_number(self, html):
+        return await run_in_parse_pool(self.extract_product_page, html, product)
+
+    @staticmethod
+    def extract_last_page_number(html):
         tree = HTMLParser(html)
         pagination = tree.css_first("ul.pagination.df.ac")
         if not pagination:
@@ -45,7 +53,8 @@ class JaraParser:
             print("[ОШИБКА] Не удалось распарсить номер последней страницы")
             return 1
 
-    async def parse_list_page(self, html):
+    @staticmethod
+    def extract_list_page(html):
         tree = HTMLParser(html)
         products = []
 
@@ -75,12 +84,8 @@ class JaraParser:
 
         return products
 
-    async def parse_product_page(self, session, product):
-        html = await self.fetch(session, product["url"])
-        if not html:
-            print(f"[ОШИБКА] Не удалось загрузить страницу товара {product['url']}")
-            return None
-
+    @staticmethod
+    def extract_product_page(html, product):
         tree = HTMLParser(html)
 
         # Перепроверка имени
@@ -125,17 +130,17 @@ class JaraParser:
 
         return product
 
-    async def run(self):
-        """Главная функция парсинга."""
+    async def iter_products(self):
+        """Главная функция парсинга: отдаёт товары по мере загрузки их страниц."""
         products = []
 
-        async with aiohttp.ClientSession() as session:
+        async with http_session() as session:
             first_page_url = f"{self.base_url}1"
             print(f"Парсим первую страницу: {first_page_url}")
             first_page_html = await self.fetch(session, first_page_url)
             if not first_page_html:
                 print("[ОШИБКА] Ошибка загрузки первой страницы")
-                return []
+                return
 
             last_page_number = await self.get_last_page_number(first_page_html)
             print(f"Найдено страниц: {last_page_number}")
@@ -144,11 +149,9 @@ class JaraParser:
             first_page_products = await self.parse_list_page(first_page_html)
             products.extend(first_page_products)
 
-            # Остальные страницы
-            for page in range(2, last_page_number + 1):
-                url = f"{self.base_url}{page}"
-                print(f"Парсим страницу: {url}")
-                html = await self.fetch(session, url)
+            # Остальные страницы загружаем параллельно, сохраняя порядок
+            page_urls = [f"{self.base_url}{page}" for page in range(2, last_page_number + 1)]
+            async for url, html in self.iter_pages(session, page_urls):
                 if not html:
                     continue
                 page_products = await self.parse_list_page(html)
@@ -156,21 +159,17 @@ class JaraParser:
 
             print(f"Собрано {len(products)} товаров для детального парсинга.")
 
-            detailed_products = []
-            for i, product in enumerate(products, start=1):
-                detailed_product = await self.parse_product_page(session, product)
-                if detailed_product:
-                    detailed_products.append(detailed_product)
-                    print(
-                        f"[{i}/{len(products)}] {detailed_product['name']} – {detailed_product['price']} {detailed_product['currency']} | BTU: {detailed_product['btu']} | Площадь: {detailed_product['service_area']} | Магазин: {detailed_product['store']} | URL: {detailed_product['url']}"
-                    )
-
-            return detailed_products
+            async for detailed_product in self.iter_details(session, products):
+                yield detailed_product
 
 
 async def main():
     parser = JaraParser()
-    results = await parser.run()
+    try:
+        results = await parser.run()
+    finally:
+        await close_http_session()
+        close_http_archive()
 
     db = get_mongo_client()
     saver = MongoDBParserSaver(db)
@@ -2,19 +2,32 @@ import asyncio
 import aiohttp
 import re
 from selectolax.parser import HTMLParser
+from parsers.baseParser import BaseParser, PARSER_REFRESH_SLOTS
 from services.db import get_mongo_client
+from services.http_archive import ArchiveMiss, close_http_archive
+from services.http_client import http_session, close_http_session
+from services.parse_pool import run_in_parse_pool
 from services.mongodb_saver import MongoDBParserSaver
 
-class TermoControlParser:
+class TermoControlParser(BaseParser):
+    store_name = "termocontrol"
     base_url = "https://termocontrol.md/ru/catalog/split"
+    # Сайт чувствителен к нагрузке, поэтому ограничитель не поднимает окно выше 3 запросов
+    max_concurrency = 3
+    # В каталоге нет цены, поэтому изменения цены ловим более частым круговым обновлением
+    listing_fields = ("name",)
+    refresh_slots = max(1, PARSER_REFRESH_SLOTS // 4)
 
     async def fetch(self, session, url):
         """Функция запроса страницы с таймаутом и обработкой ошибок."""
         try:
-            async with session.get(url, timeout=10) as response:
-                if response.status == 404:
-                    return None
-                return await response.text()
+            status, text = await self.request(session, url)
+            if status == 404:
+                return None
+            return text
+        except ArchiveMiss:
+            print(f"[REPLAY] Нет ответа в архиве для {url}")
+            return None
         except asyncio.TimeoutError:
             print(f"[ОШИБКА] Тайм-аут при запросе {url}")
             return None
@@ -26,6 +39,10 @@ class TermoControlParser:
             return None
 
     async def parse_list_page(self, html):
+        return await run_in_parse_pool(self.extract_list_page, html)
+
+    @staticmethod
+    def extract_list_page(html):
         """Собираем name и url с одной страницы каталога."""
         try:
             tree = HTMLParser(html)
@@ -53,6 +70,16 @@ class TermoControlParser:
                 print(f"[ОШИБКА] Не удалось загрузить страницу товара {product['url']}")
                 return None
 
+            return await run_in_parse_pool(self.extract_product_page, html, product)
+
+        except Exception as e:
+            print(f"[ОШИБКА] Ошибка парсинга товара {product['url']}: {e}")
+            return None
+
+    @staticmethod
+    def extract_product_page(html, product):
+        """Разбор страницы товара (выполняется в пуле процессов)."""
+        try:
             tree = HTMLParser(html)
 
             # Перепроверка имени
@@ -81,10 +108,10 @@ class TermoControlParser:
                 value_text = value_div.text(strip=True)
 
                 if "btu" in name_text or "произв" in name_text:
-                    product["btu"] = self.extract_max_number(value_text, "BTU")
+                    product["btu"] = TermoControlParser.extract_max_number(value_text, "BTU")
 
                 if "площадь" in name_text or "suprafața" in name_text:
-                    product["service_area"] = f"{self.extract_max_number(value_text)} м²"
+                    product["service_area"] = f"{TermoControlParser.extract_max_number(value_text)} м²"
 
             product["store"] = "termocontrol"
 
@@ -105,51 +132,35 @@ class TermoControlParser:
             print(f"[ОШИБКА] Ошибка парсинга товара {product['url']}: {e}")
             return None
 
-    async def run(self):
-        products = []
-        async with aiohttp.ClientSession() as session:
-            page = 1
-
-            # 1. Сбор списка всех товаров
-            while True:
-                if page == 1:
-                    url = self.base_url
-                else:
-                    url = f"{self.base_url}/page-{page}"
-
-                print(f"Парсим страницу: {url}")
-                html = await self.fetch(session, url)
+    def catalog_page_url(self, page):
+        return self.base_url if page == 1 else f"{self.base_url}/page-{page}"
 
-                if html is None:
-                    print(f"Страница {page} не найдена (404). Заканчиваем парсинг.")
-                    break
-
-                page_products = await self.parse_list_page(html)
-                if not page_products:
-                    print(f"Пустая страница {page}. Возможно, товары закончились.")
-                    break
+    async def parse_catalog_page(self, html, page):
+        """Страница каталога без ссылки «дальше»: следующая страница есть, пока текущая не пуста."""
+        page_products = await self.parse_list_page(html)
+        if not page_products:
+            print(f"Пустая страница {page}. Возможно, товары закончились.")
+            return page_products, None
+        return page_products, self.catalog_page_url(page + 1)
 
+    async def iter_products(self):
+        """Главная функция парсинга: отдаёт товары по мере загрузки их страниц."""
+        products = []
+        async with http_session() as session:
+            # 1. Сбор списка всех товаров (до 404 или пустой страницы) с упреждающей загрузкой
+            async for page_products in self.iter_linked_pages(
+                session, self.catalog_page_url(1), self.parse_catalog_page, self.catalog_page_url
+            ):
                 products.extend(page_products)
-                page += 1
 
             print(f"Собрано {len(products)} товаров для детального парсинга.")
 
             # 2. Парсим детали товаров
-            detailed_products = []
-            for i, product in enumerate(products, start=1):
-                detailed_product = await self.parse_product_page(session, product)
-                await asyncio.sleep(0.2)
-                if detailed_product:
-                    detailed_products.append(detailed_product)
-                    print(
-                        f"[{i}/{len(products)}] {detailed_product['name']} – {detailed_product['price']} {detailed_product['currency']} | "
-                        f"BTU: {detailed_product['btu']} | Площадь: {detailed_product['service_area']} | Магазин: {detailed_product['store']} | URL: {detailed_product['url']}"
-                    )
-
-            print(f"\nСобрано детально {len(detailed_products)} товаров")
-            return detailed_products
-
-    def extract_max_number(self, text, unit=""):
+            async for detailed_product in self.iter_details(session, products):
+                yield detailed_product
+
+    @staticmethod
+    def extract_max_number(text, unit=""):
         """Извлекает наибольшее число из строки, игнорируя все символы, кроме чисел."""
         # Ищем все числа в строке
         numbers = re.findall(r'\d+', text)
@@ -163,7 +174,11 @@ class TermoControlParser:
 
 async def main():
     parser = TermoControlParser()
-    results = await parser.run()
+    try:
+        results = await parser.run()
+    finally:
+        await close_http_session()
+        close_http_archive()
 
     db = get_mongo_client()
     saver = MongoDBParserSaver(db)
@@ -1,33 +1,26 @@
 import asyncio
-import aiohttp
 import re
 from selectolax.parser import HTMLParser
+from parsers.baseParser import BaseParser, PARSER_REFRESH_SLOTS
 from services.db import get_mongo_client
+from services.http_archive import close_http_archive
+from services.http_client import http_session, close_http_session
+from services.parse_pool import run_in_parse_pool
 from services.mongodb_saver import MongoDBParserSaver
 
 
-class TermoformatParser:
+class TermoformatParser(BaseParser):
+    store_name = "termoformat"
     base_url = "https://termoformat.md"
-
-    async def fetch(self, session, url):
-        """Функция запроса страницы."""
-        try:
-            async with session.get(url, timeout=10) as response:
-                if response.status != 200:
-                    print(f"[ОШИБКА] Ошибка запроса {url}: {response.status}")
-                    return None
-                return await response.text()
-        except asyncio.TimeoutError:
-            print(f"[ОШИБКА] Тайм-аут при запросе {url}")
-            return None
-        except aiohttp.ClientError as e:
-            print(f"[ОШИБКА] Сетевая ошибка при запросе {url}: {e}")
-            return None
-        except Exception as e:
-            print(f"[ОШИБКА] Неизвестная ошибка при запросе {url}: {e}")
-            return None
+    # В каталоге нет цены, поэтому изменения цены ловим более частым круговым обновлением
+    listing_fields = ("name",)
+    refresh_slots = max(1, PARSER_REFRESH_SLOTS // 4)
 
     async def parse_list_page(self, html):
+        return await run_in_parse_pool(self.extract_list_page, html, self.base_url)
+
+    @staticmethod
+    def extract_list_page(html, base_url):
         """Парсим страницу списка товаров, собираем ссылки на товары и проверяем наличие следующей страницы."""
         tree = HTMLParser(html)
         products = []
@@ -40,7 +33,7 @@ class TermoformatParser:
 
             if url and name:
                 if not url.startswith("http"):
-                    url = self.base_url + url
+                    url = base_url + url
                 products.append({
                     "url": url,
                     "name": name
@@ -49,7 +42,7 @@ class TermoformatParser:
         next_page_element = tree.css_first("div.pagination a.arrow.right")
         next_page_url = next_page_element.attributes.get("href") if next_page_element else None
         if next_page_url and not next_page_url.startswith("http"):
-            next_page_url = self.base_url + next_page_url
+            next_page_url = base_url + next_page_url
 
         return products, next_page_url
 
@@ -60,6 +53,11 @@ class TermoformatParser:
             print(f"[ОШИБКА] Не удалось загрузить страницу товара {product['url']}")
             return None
 
+        return await run_in_parse_pool(self.extract_product_page, html, product)
+
+    @staticmethod
+    def extract_product_page(html, product):
+        """Разбор страницы товара (выполняется в пуле процессов)."""
         try:
             tree = HTMLParser(html)
 
@@ -129,43 +127,38 @@ class TermoformatParser:
             print(f"[ОШИБКА] Ошибка при парсинге товара {product['url']}: {e}")
             return None
 
-    async def run(self):
-        products = []
-
-        async with aiohttp.ClientSession() as session:
-            next_page_url = f"{self.base_url}/ru/kondicioneri/split_sistemi/1"
+    def catalog_page_url(self, page):
+        return f"{self.base_url}/ru/kondicioneri/split_sistemi/{page}"
 
-            # Сбор всех товаров со всех страниц
-            while next_page_url:
-                print(f"Парсим страницу: {next_page_url}")
-                html = await self.fetch(session, next_page_url)
-                if not html:
-                    print(f"[ОШИБКА] Не удалось загрузить страницу {next_page_url}")
-                    break
+    async def iter_products(self):
+        """Главная функция парсинга: отдаёт товары по мере загрузки их страниц."""
+        products = []
 
-                page_products, next_page_url = await self.parse_list_page(html)
+        async with http_session() as session:
+            # Сбор всех товаров со всех страниц: идём по ссылкам «дальше»,
+            # заранее загружая следующие страницы по предсказанному адресу
+            async for page_products in self.iter_linked_pages(
+                session,
+                self.catalog_page_url(1),
+                lambda html, page: self.parse_list_page(html),
+                self.catalog_page_url,
+            ):
                 products.extend(page_products)
 
             print(f"Собрано {len(products)} товаров для детального парсинга.")
 
             # Подробный парсинг карточек товаров
-            detailed_products = []
-            for i, product in enumerate(products, start=1):
-                detailed_product = await self.parse_product_page(session, product)
-                if detailed_product:
-                    detailed_products.append(detailed_product)
-                    print(
-                        f"[{i}/{len(products)}] {detailed_product['name']} – {detailed_product['price']} {detailed_product['currency']} | "
-                        f"BTU: {detailed_product['btu']} | Площадь: {detailed_product['service_area']} | Магазин: {detailed_product['store']} | URL: {detailed_product['url']}"
-                    )
-
-            print(f"\nСобрано детально {len(detailed_products)} товаров")
-            return detailed_products
+            async for detailed_product in self.iter_details(session, products):
+                yield detailed_product
 
 
 async def main():
     parser = TermoformatParser()
-    results = await parser.run()
+    try:
+        results = await parser.run()
+    finally:
+        await close_http_session()
+        close_http_archive()
 
     db = get_mongo_client()
     saver = MongoDBParserSaver(db)
@@ -1,11 +1,19 @@
 import json
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
 from models.btu_request_model import BTURequestModel
 from models.btu_response_model import BTUResponseModel
 from services.btu_calculator import calculate_btu
+from services.catalog_index import get_catalog_index, index_stats
+from services.catalog_publisher import get_async_catalog_collection
+from services.db import get_async_mongo_client
+from services.pagination import HIDDEN_FIELDS
 
 router = APIRouter()
 
+db = get_async_mongo_client()
+
+MAX_RECOMMENDATIONS = 50
+
 @router.post(
     "/BTUCalcService/calculate_btu",
     response_model=BTUResponseModel,
@@ -24,3 +32,57 @@ async def calculate_btu_route(request: Request):
     except Exception as e:
         print("Ошибка при обработке запроса:", str(e)) 
         raise HTTPException(status_code=400, detail=f"Ошибка при расчёте BTU: {str(e)}")
+
+
+def recommend_pipeline(low, high, target, limit: int, order: str) -> list:
+    """Тот же отбор, что и CatalogIndex.recommend, одной агрегацией (если снимок каталога выключен)."""
+    sort = {"_distance": 1} if order == "fit" else {}
+    sort.update({"_no_price": 1, "price_value": 1, "_id": 1})
+    return [
+        {"$match": {"btu_value": {"$gte": low, "$lte": high}}},
+        {"$addFields": {
+            "_distance": {"$abs": {"$subtract": ["$btu_value", target]}},
+            "_no_price": {"$eq": [{"$ifNull": ["$price_value", None]}, None]},
+        }},
+        {"$sort": sort},
+        {"$limit": limit},
+        {"$project": {"_distance": 0, "_no_price": 0, **{field: 0 for field in HIDDEN_FIELDS - {"_id"}}}},
+    ]
+
+
+@router.post(
+    "/BTUCalcService/recommend",
+    summary="Рассчитать BTU и подобрать кондиционеры",
+    description="Рассчитывает мощность, как /calculate_btu, и сразу возвращает подходящие товары из рекомендованного диапазона BTU."
+)
+async def recommend_route(
+    request: Request,
+    limit: int = Query(5, ge=1, le=MAX_RECOMMENDATIONS, description="Сколько товаров вернуть"),
+    order: str = Query("price", pattern="^(price|fit)$", description="price — самые дешёвые, fit — ближе всего по BTU"),
+):
+    """Расчёт BTU и первые limit товаров каталога в рекомендованном диапазоне одним запросом."""
+    try:
+        body = await request.json()
+        validated_request = BTURequestModel(**body)
+        result = calculate_btu(validated_request)
+    except Exception as e:
+        print("Ошибка при обработке запроса:", str(e))
+        raise HTTPException(status_code=400, detail=f"Ошибка при расчёте BTU: {str(e)}")
+
+    low = result.recommended_range_btu.lower
+    high = result.recommended_range_btu.upper
+    target = result.calculated_power_btu
+
+    collection = await get_async_catalog_collection(db)
+    index = await get_catalog_index(collection)
+    if index is not None:
+        products = index.recommend(low, high, target, limit, order)
+        index_stats.queries += 1
+    else:
+        products = await collection.aggregate(recommend_pipeline(low, high, target, limit, order))
+
+    return {
+        "calculation": result.model_dump(),
+        "order": order,
+        "products": [{k: v for k, v in product.items() if k not in HIDDEN_FIELDS} for product in products],
+    }
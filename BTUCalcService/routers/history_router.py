@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Query
+from services.db import get_async_mongo_client
+from services.price_history import PRICE_HISTORY, STORE_PRICES, history_since, rollup_collection
+
+router = APIRouter(prefix="/BTUCalcService/history", tags=["History"])
+
+db = get_async_mongo_client()
+
+@router.get("/product")
+async def get_product_price_history(
+    url: str = Query(..., description="URL товара в магазине"),
+    granularity: str = Query("day", pattern="^(raw|hour|day)$", description="raw — все изменения, hour/day — свёртки"),
+    days: int = Query(30, ge=1, le=3650, description="За сколько последних дней"),
+):
+    """История цены и наличия товара: исходные изменения или свёртки по часам/дням."""
+    since = history_since(days)
+
+    if granularity == "raw":
+        rows = await db[PRICE_HISTORY].find(
+            {"meta.url": url, "ts": {"$gte": since}},
+            {"_id": 0, "ts": 1, "price_value": 1, "btu_value": 1, "available": 1, "store": "$meta.store"},
+            sort=[("ts", 1)],
+        )
+    else:
+        rows = await db[rollup_collection(PRICE_HISTORY, granularity)].find(
+            {"url": url, "bucket": {"$gte": since}},
+            {"_id": 0},
+            sort=[("bucket", 1)],
+        )
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="История товара не найдена")
+
+    return {"url": url, "granularity": granularity, "history": rows}
+
+
+@router.get("/stores/{store_name}/price-index")
+async def get_store_price_index(
+    store_name: str,
+    granularity: str = Query("day", pattern="^(hour|day)$", description="Свёртка по часам или дням"),
+    days: int = Query(90, ge=1, le=3650, description="За сколько последних дней"),
+):
+    """
+    Ценовой индекс магазина: средняя цена по периодам и её отношение к первому
+    периоду выборки (index = 100 в начале).
+    """
+    rows = await db[rollup_collection(STORE_PRICES, granularity)].find(
+        {"store": store_name.lower(), "bucket": {"$gte": history_since(days)}},
+        {"_id": 0},
+        sort=[("bucket", 1)],
+    )
+
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"Нет истории цен магазина {store_name}")
+
+    base_price = next((row["avg_price"] for row in rows if row.get("avg_price")), None)
+    for row in rows:
+        row["index"] = round(row["avg_price"] / base_price * 100, 2) if base_price and row.get("avg_price") else None
+
+    return {"store": store_name.lower(), "granularity": granularity, "index": rows}
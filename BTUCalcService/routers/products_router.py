@@ -1,13 +1,181 @@
-from fastapi import APIRouter, HTTPException, Query
-from services.db import get_mongo_client
+import functools
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from services.catalog_cache import CATALOG_TAG, get_catalog_cache
+from services.db import get_async_mongo_client
+from services.catalog_publisher import get_async_catalog_collection
+from services.catalog_changes import read_catalog_changes
+from services.catalog_index import get_catalog_index, index_stats
+from services.catalog_stats import CATALOG_STATS, refresh_catalog_stats
+from services.catalog_queries import (
+    btu_filter, btu_range_filter, price_filter, price_range_filter, search_filter, service_area_bounds,
+    service_area_filter,
+)
+from services.pagination import HIDDEN_FIELDS, PageQuery
 import logging
 
 router = APIRouter(prefix="/BTUCalcService/products", tags=["Products"])
 
-db = get_mongo_client()
+# Запросы к MongoDB выполняются в пуле потоков и не блокируют event loop
+db = get_async_mongo_client()
 
 logger = logging.getLogger(__name__)
 
+# Служебные поля товара наружу не отдаём
+PRODUCT_PROJECTION = {field: 0 for field in HIDDEN_FIELDS}
+
+MAX_PAGE_SIZE = 1000
+NDJSON = "application/x-ndjson"
+
+
+def page_params(default_sort: str, nulls_last: bool = False):
+    """
+    Параметры постраничной выдачи списка товаров (сортировка по умолчанию своя у эндпоинта).
+    nulls_last — товары без значения поля сортировки в конце списка (см. PageQuery).
+    """
+    def dependency(
+        limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы; без него — весь список"),
+        after: str = Query(None, description="Курсор из заголовка X-Next-After (в NDJSON — строки next_after) предыдущей страницы"),
+        sort: str = Query(default_sort, description="Поле сортировки, '-' в начале — по убыванию"),
+        fields: str = Query(None, description="Поля товара через запятую"),
+    ) -> PageQuery:
+        try:
+            return PageQuery(sort, after, limit, fields, nulls_last)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return dependency
+
+
+async def ndjson_response(collection, query: dict, page: PageQuery):
+    """
+    Товары построчно по мере чтения курсора. Первый документ читается до начала
+    ответа, чтобы пустой результат давал 404, как в JSON. Курсор следующей
+    страницы заголовком уже не передать, поэтому при limit он приходит
+    последней строкой {"next_after": ...}.
+    """
+    documents = stream_page(collection, query, page)
+    first = await anext(documents, None)
+    if first is None:
+        await documents.aclose()
+        if page.after is None:
+            raise HTTPException(status_code=404, detail="Товары не найдены")
+    return StreamingResponse(ndjson_lines(first, documents, page), media_type=NDJSON)
+
+
+async def stream_page(collection, query: dict, page: PageQuery):
+    """Документы страницы (и лишний для курсора) по мере чтения, по запросам page.queries."""
+    remaining = page.limit + 1 if page.limit else None
+    for match, sort in page.queries(query):
+        documents = collection.stream(match, page.projection(), sort=sort, limit=remaining or 0)
+        try:
+            async for document in documents:
+                yield document
+                if remaining:
+                    remaining -= 1
+        finally:
+            await documents.aclose()
+        if remaining == 0:
+            return
+
+
+async def find_page(collection, query: dict, page: PageQuery) -> list:
+    """Документы страницы и лишний документ, показывающий, что за ней есть ещё товары."""
+    products = []
+    for match, sort in page.queries(query):
+        limit = page.limit + 1 - len(products) if page.limit else 0
+        products += await collection.find(match, page.projection(), sort=sort, limit=limit)
+        if page.limit and len(products) > page.limit:
+            break
+    return products
+
+
+async def ndjson_lines(document, documents, page: PageQuery):
+    count, last = 0, None
+    try:
+        while document is not None:
+            if page.limit and count == page.limit:
+                yield json.dumps({"next_after": page.cursor_for(last)}) + "\n"
+                break
+            yield json.dumps(jsonable_encoder(page.clean(document)), ensure_ascii=False) + "\n"
+            count, last = count + 1, document
+            document = await anext(documents, None)
+    finally:
+        await documents.aclose()
+
+
+async def indexed_products(collection, index_range: tuple, page: PageQuery):
+    """Выборка из снимка каталога в памяти; None — запрос нужно выполнить в MongoDB."""
+    index = await get_catalog_index(collection)
+    if index is None:
+        return None
+    field, low, high = index_range
+    products = index.select(index.range(field, low, high), page)
+    if products is None:
+        index_stats.fallbacks += 1
+    else:
+        index_stats.queries += 1
+    return products
+
+
+async def product_list(request: Request, collection, query: dict, page: PageQuery, index_range: tuple = None):
+    """
+    Список товаров по фильтру. При Accept: application/x-ndjson товары пишутся
+    в ответ построчно по мере чтения курсора (см. ndjson_response). Иначе — JSON-массив,
+    как раньше; если задан limit и есть следующая страница, её курсор в заголовке X-Next-After.
+    index_range = (поле, от, до) — тот же фильтр для снимка каталога в памяти.
+    """
+    if NDJSON in request.headers.get("accept", ""):
+        return await ndjson_response(collection, query, page)
+
+    products = await indexed_products(collection, index_range, page) if index_range else None
+    if products is None:
+        products = await find_page(collection, query, page)
+
+    if not products and page.after is None:
+        raise HTTPException(status_code=404, detail="Товары не найдены")
+
+    headers = {}
+    if page.limit and len(products) > page.limit:
+        products = products[:page.limit]
+        headers["X-Next-After"] = page.cursor_for(products[-1])
+
+    return JSONResponse(jsonable_encoder([page.clean(product) for product in products]), headers=headers)
+
+
+def cached_response(tag=lambda params: CATALOG_TAG):
+    """
+    Кэширует ответ эндпоинта в памяти процесса. Ключ — путь и отсортированные
+    параметры запроса; tag(params) — магазин, от которого зависит ответ,
+    или CATALOG_TAG. Ошибки и потоковые ответы (NDJSON) не кэшируются.
+    Эндпоинт должен принимать request: Request.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(**params):
+            request: Request = params["request"]
+            cache = get_catalog_cache()
+            if cache is None or NDJSON in request.headers.get("accept", ""):
+                return await endpoint(**params)
+
+            key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+            hit = cache.get(key)
+            if hit is not None:
+                body, headers = hit
+                return Response(body, media_type="application/json", headers=headers)
+
+            generation = cache.generation
+            response = await endpoint(**params)
+            if not isinstance(response, Response):
+                response = JSONResponse(jsonable_encoder(response))
+            headers = {name: value for name, value in response.headers.items() if name.startswith("x-")}
+            cache.put(key, bytes(response.body), headers, {tag(params)}, generation)
+            return response
+        return wrapper
+    return decorator
+
+
 # Функция для преобразования строки в число (если возможно)
 def parse_btu(value):
     try:
@@ -16,9 +184,12 @@ def parse_btu(value):
         return value  # Если не удается преобразовать, оставляем как строку
 
 @router.get("/range/")
+@cached_response()
 async def get_products_by_btu_range(
+    request: Request,
     btu_min: int = Query(..., description="Минимальное значение BTU"),
     btu_max: int = Query(..., description="Максимальное значение BTU"),
+    page: PageQuery = Depends(page_params("btu_value")),
 ):
     """Получить кондиционеры по диапазону BTU из общей коллекции."""
     btu_min = parse_btu(btu_min)
@@ -30,33 +201,27 @@ async def get_products_by_btu_range(
             detail="Минимальное значение BTU не может быть больше максимального",
         )
 
-    collection = db["all_products"]
+    collection = await get_async_catalog_collection(db)
 
-    products = list(
-        collection.find(
-            {"btu": {"$gte": btu_min, "$lte": btu_max, "$ne": None}},
-            {"_id": 0},
-        )
+    return await product_list(
+        request, collection, btu_range_filter(btu_min, btu_max), page,
+        index_range=("btu_value", btu_min, btu_max),
     )
 
-    if not products:
-        raise HTTPException(status_code=404, detail="Товары не найдены")
-
-    return products
-
 @router.get("/btu/{btu}")
-async def get_products_by_exact_btu(btu: str):
+@cached_response()
+async def get_products_by_exact_btu(btu: str, request: Request):
     """Получить кондиционеры по конкретному BTU из общей коллекции."""
     btu = parse_btu(btu)
 
-    collection = db["all_products"]
+    collection = await get_async_catalog_collection(db)
 
-    products = list(
-        collection.find(
-            {"btu": btu},
-            {"_id": 0},
+    if isinstance(btu, int):
+        return await product_list(
+            request, collection, btu_filter(btu), PageQuery("btu_value"), index_range=("btu_value", btu, btu)
         )
-    )
+
+    products = await collection.find({"btu": btu}, PRODUCT_PROJECTION)
 
     if not products:
         raise HTTPException(status_code=404, detail="Товары не найдены")
@@ -64,69 +229,31 @@ async def get_products_by_exact_btu(btu: str):
     return products
 
 @router.get("/extremes/")
-async def get_extreme_btu_products():
+@cached_response()
+async def get_extreme_btu_products(request: Request):
     """Получить кондиционеры с минимальным и максимальным BTU."""
-    collection = db["all_products"]
-
-    extreme_values = collection.aggregate([
-        {
-            "$project": {
-                "btu": {
-                    "$toInt": {
-                        "$arrayElemAt": [
-                            {"$split": [{"$toString": "$btu"}, " "]},
-                            0
-                        ]
-                    }
-                },
-                "name": 1, "price": 1, "currency": 1, "service_area": 1,
-                "store": 1, "url": 1
-            }
-        },
-        {
-            "$group": {
-                "_id": None,
-                "min_btu": {"$min": "$btu"},
-                "max_btu": {"$max": "$btu"}
-            }
-        }
-    ])
-
-    extremes = next(extreme_values, None)
-    if not extremes or extremes["min_btu"] is None or extremes["max_btu"] is None:
+    collection = await get_async_catalog_collection(db)
+
+    # Сводка пересчитывается при каждом сохранении каталога; здесь — одно чтение по _id
+    stats = await db[CATALOG_STATS].find_one({"_id": collection.name})
+    if stats is None:
+        logger.warning(f"⚠️ Нет сводки для {collection.name}, пересчитываем")
+        stats = await db.run(lambda database: refresh_catalog_stats(database, collection.delegate))
+
+    btu_min = stats["btu_min"]
+    btu_max = stats["btu_max"]
+    if btu_min is None or btu_max is None:
         logger.error("❌ Не удалось определить диапазоны BTU")
         raise HTTPException(status_code=404, detail="Не удалось определить диапазоны BTU")
 
-    btu_min = extremes["min_btu"]
-    btu_max = extremes["max_btu"]
-
     logger.info(f"🔍 Найден диапазон BTU: min={btu_min}, max={btu_max}")
 
-    products = list(collection.aggregate([
-        {
-            "$project": {
-                "btu": {
-                    "$toInt": {
-                        "$arrayElemAt": [
-                            {"$split": [{"$toString": "$btu"}, " "]},
-                            0
-                        ]
-                    }
-                },
-                "name": 1, "price": 1, "currency": 1, "service_area": 1,
-                "store": 1, "url": 1
-            }
-        },
-        {"$match": {"btu": {"$in": [btu_min, btu_max]}}}
-    ]))
-
+    products = stats["extreme_products"]
     if not products:
         logger.warning("⚠️ Товары с крайними BTU не найдены")
         raise HTTPException(status_code=404, detail="Товары с крайними BTU не найдены")
 
     logger.info(f"✅ Найдено {len(products)} товаров с крайними значениями BTU")
-    for product in products:
-        logger.info(f"📌 {product}")
 
     return {
         "btu_min": btu_min,
@@ -136,9 +263,10 @@ async def get_extreme_btu_products():
 
 
 @router.get("/stores/")
-async def get_stores():
+@cached_response()
+async def get_stores(request: Request):
     """Получить список магазинов с кондиционерами."""
-    stores = db.list_collection_names()
+    stores = await db.list_collection_names()
     stores = [store.replace("_products", "") for store in stores if store.endswith("_products")]
     
     if not stores:
@@ -147,79 +275,154 @@ async def get_stores():
     return {"stores": stores}
 
 @router.get("/store/{store_name}")
-async def get_products_by_store(store_name: str):
+@cached_response(tag=lambda params: params["store_name"].lower())
+async def get_products_by_store(
+    store_name: str,
+    request: Request,
+    page: PageQuery = Depends(page_params("_id")),
+):
     """Получить кондиционеры из конкретного магазина."""
     collection_name = f"{store_name.lower()}_products"
-    if collection_name not in db.list_collection_names():
+    if collection_name not in await db.list_collection_names():
         raise HTTPException(status_code=404, detail=f"Магазин {store_name} не найден")
 
-    products = list(
-        db[collection_name].find(
-            {"_id": {"$ne": "metadata"}},
-            {"_id": 0},
-        )
-    )
-
-    if not products:
-        raise HTTPException(status_code=404, detail="Товары не найдены")
-
-    return products
+    return await product_list(request, db[collection_name], {"_id": {"$ne": "metadata"}}, page)
 
 
 @router.get("/service_area/{area}")
-async def get_products_by_service_area(area: int):
+@cached_response()
+async def get_products_by_service_area(
+    area: int,
+    request: Request,
+    page: PageQuery = Depends(page_params("service_area_value")),
+):
     """Получить кондиционеры по точной площади обслуживания или в диапазоне ±5 м²."""
-    collection = db["all_products"]
+    collection = await get_async_catalog_collection(db)
     
     # Ищем кондиционеры в диапазоне ±5 м²
-    products = list(
-        collection.find(
-            {"service_area": {"$gte": area - 5, "$lte": area + 5}},  # Диапазон для гибкого поиска
-            {"_id": 0},
-        )
+    return await product_list(
+        request, collection, service_area_filter(area), page,
+        index_range=("service_area_value", *service_area_bounds(area)),
     )
-    
-    if not products:
-        raise HTTPException(status_code=404, detail="Товары не найдены")
-    
-    return products
 
 @router.get("/price/{price}")
-async def get_products_by_exact_price(price: int):
+@cached_response()
+async def get_products_by_exact_price(price: int, request: Request):
     """Получить кондиционеры по конкретной цене."""
-    collection = db["all_products"]
+    collection = await get_async_catalog_collection(db)
     
-    products = list(
-        collection.find(
-            {"price": price},
-            {"_id": 0},
-        )
+    return await product_list(
+        request, collection, price_filter(price), PageQuery("price_value"), index_range=("price_value", price, price)
     )
-    
-    if not products:
-        raise HTTPException(status_code=404, detail="Товары не найдены")
-    
-    return products
 
 @router.get("/price/")
+@cached_response()
 async def get_products_by_price_range(
+    request: Request,
     price_min: int = Query(..., description="Минимальная цена"),
-    price_max: int = Query(..., description="Максимальная цена")
+    price_max: int = Query(..., description="Максимальная цена"),
+    page: PageQuery = Depends(page_params("price_value")),
 ):
     """Получить кондиционеры по диапазону цен."""
     if price_min > price_max:
         raise HTTPException(status_code=400, detail="Минимальная цена не может быть больше максимальной")
     
-    collection = db["all_products"]
+    collection = await get_async_catalog_collection(db)
     
-    products = list(
-        collection.find(
-            {"price": {"$gte": price_min, "$lte": price_max}},
-            {"_id": 0},
-        )
+    return await product_list(
+        request, collection, price_range_filter(price_min, price_max), page,
+        index_range=("price_value", price_min, price_max),
     )
-    
-    if not products:
+
+def search_pipeline(query: dict, page: PageQuery, btu_bucket: int) -> list:
+    """
+    Один проход по товарам фильтра ($match по индексам), из которого $facet
+    собирает страницу товаров, общее число, число товаров по магазинам
+    и по корзинам BTU шириной btu_bucket.
+    """
+    return [
+        {"$match": query},
+        {"$facet": {
+            "products": page.pipeline({}),
+            "total": [{"$count": "count"}],
+            "stores": [
+                {"$group": {"_id": "$source", "count": {"$sum": 1}}},
+                {"$sort": {"_id": 1}},
+            ],
+            "btu": [
+                {"$match": {"btu_value": {"$ne": None}}},
+                {"$group": {
+                    "_id": {"$subtract": ["$btu_value", {"$mod": ["$btu_value", btu_bucket]}]},
+                    "count": {"$sum": 1},
+                }},
+                {"$sort": {"_id": 1}},
+            ],
+        }},
+    ]
+
+
+@router.get("/search")
+@cached_response()
+async def search_products(
+    request: Request,
+    btu_min: int = Query(None, description="Минимальное значение BTU"),
+    btu_max: int = Query(None, description="Максимальное значение BTU"),
+    price_min: int = Query(None, description="Минимальная цена"),
+    price_max: int = Query(None, description="Максимальная цена"),
+    area_min: int = Query(None, description="Минимальная площадь, м²"),
+    area_max: int = Query(None, description="Максимальная площадь, м²"),
+    store: list[str] = Query(None, description="Магазины: store=a&store=b или store=a,b"),
+    facets: bool = Query(False, description="Добавить число товаров по магазинам и корзинам BTU"),
+    btu_bucket: int = Query(3000, ge=100, description="Ширина корзины BTU для фасетов"),
+    page: PageQuery = Depends(page_params("price_value", nulls_last=True)),
+):
+    """
+    Поиск по любому сочетанию диапазонов BTU, цены и площади и списку магазинов
+    одним запросом к общему каталогу. Без facets ответ — массив товаров, как у
+    остальных списков (limit/after/sort/fields, NDJSON). С facets=true — объект
+    с товарами страницы, общим числом и фасетами, посчитанными в том же проходе.
+    Товары без значения поля сортировки (например, без цены) идут в конце списка.
+    """
+    bounds = {"btu": (btu_min, btu_max), "price": (price_min, price_max), "area": (area_min, area_max)}
+    stores = sorted({name.strip().lower() for value in store or [] for name in value.split(",") if name.strip()})
+    try:
+        query = search_filter(bounds, stores)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    collection = await get_async_catalog_collection(db)
+
+    if not facets:
+        return await product_list(request, collection, query, page)
+
+    result = (await collection.aggregate(search_pipeline(query, page, btu_bucket)))[0]
+    products = result["products"]
+    if not products and page.after is None:
         raise HTTPException(status_code=404, detail="Товары не найдены")
-    
-    return products
\ No newline at end of file
+
+    headers = {}
+    if page.limit and len(products) > page.limit:
+        products = products[:page.limit]
+        headers["X-Next-After"] = page.cursor_for(products[-1])
+
+    return JSONResponse(jsonable_encoder({
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "products": [page.clean(product) for product in products],
+        "facets": {
+            "stores": {str(row["_id"]): row["count"] for row in result["stores"]},
+            "btu": [{"from": row["_id"], "to": row["_id"] + btu_bucket, "count": row["count"]} for row in result["btu"]],
+        },
+    }), headers=headers)
+
+
+@router.get("/changes")
+async def get_catalog_changes(
+    since: int = Query(0, ge=0, description="Последний обработанный номер события"),
+    limit: int = Query(1000, ge=1, le=10000, description="Максимум событий в ответе"),
+):
+    """
+    Лента изменений каталога: события added, updated, price_changed и removed
+    с номером больше since. Потребитель сохраняет last_seq и запрашивает
+    следующую порцию, пока has_more; при reset=True копию нужно загрузить заново.
+    """
+    return await db.run(read_catalog_changes, since, limit)
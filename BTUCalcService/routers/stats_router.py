@@ -0,0 +1,73 @@
+from fastapi import APIRouter
+from services.catalog_cache import get_catalog_cache_stats
+from services.catalog_index import get_catalog_index_stats
+from services.catalog_publisher import get_catalog_collection, get_catalog_state
+from services.db import get_async_mongo_client, get_mongo_pool_stats
+from services.http_archive import get_http_archive
+from services.http_cache import get_http_cache_stats
+from services.indexes import explain_queries, index_report
+from services.http_client import get_http_stats
+from services.rate_limiter import get_rate_limiter_stats
+
+router = APIRouter(prefix="/BTUCalcService/stats", tags=["Stats"])
+
+db = get_async_mongo_client()
+
+
+@router.get("/http")
+async def get_http_client_stats():
+    """Статистика общего HTTP-клиента парсеров: соединения, DNS-кэш, трафик."""
+    return get_http_stats()
+
+
+@router.get("/http-cache")
+async def get_http_cache_statistics():
+    """Статистика дискового кэша страниц: попадания (304), промахи, вытеснения."""
+    return get_http_cache_stats()
+
+
+@router.get("/rate-limits")
+async def get_rate_limits():
+    """Текущая скорость и окно одновременных запросов по каждому сайту."""
+    return get_rate_limiter_stats()
+
+
+@router.get("/catalog-cache")
+async def get_catalog_cache_statistics():
+    """Кэш ответов каталога в памяти: попадания, промахи, объём, вытеснения."""
+    return get_catalog_cache_stats()
+
+
+@router.get("/catalog-index")
+async def get_catalog_index_statistics():
+    """Снимок каталога в памяти: число строк, перестроения, запросы и откаты в MongoDB."""
+    return get_catalog_index_stats()
+
+
+@router.get("/http-archive")
+async def get_http_archive_stats():
+    """Состояние архива ответов в режимах record/replay."""
+    archive = get_http_archive()
+    return archive.stats() if archive else {"mode": "live"}
+
+
+@router.get("/catalog")
+async def get_catalog_publish_state():
+    """Режим публикации общего каталога, текущая версия и хранимые версии."""
+    return await db.run(get_catalog_state)
+
+
+@router.get("/mongo")
+async def get_mongo_stats():
+    """Пул соединений MongoDB: открытые и занятые соединения, ожидание свободного соединения."""
+    return get_mongo_pool_stats()
+
+
+@router.get("/indexes")
+async def get_index_stats():
+    """Индексы текущей коллекции каталога и планы запросов эндпоинтов (индекс или полный просмотр)."""
+    def collect(database):
+        catalog = get_catalog_collection(database)
+        return {"report": index_report(catalog), "plans": explain_queries(catalog)}
+
+    return await db.run(collect)
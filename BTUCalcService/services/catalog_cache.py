@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CATALOG_CACHE_ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "1") == "1"
+CATALOG_CACHE_MAX_MB = int(os.getenv("CATALOG_CACHE_MAX_MB", "64"))
+# Страховка на случай записи в БД мимо сервиса (например, парсер запущен отдельным скриптом)
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "3600"))
+
+# Тег записей, которые зависят от всего каталога, а не от одного магазина
+CATALOG_TAG = "catalog"
+
+_cache = None
+
+
+class CatalogCache:
+    """
+    Кэш готовых ответов API каталога в памяти процесса. Хранится уже
+    сериализованное тело ответа, поэтому попадание не обращается к MongoDB
+    и не кодирует JSON заново. Объём ограничен суммой размеров тел, вытесняются
+    давно не использованные записи (LRU); запись живёт не дольше ttl секунд.
+
+    У записи есть теги (магазин или CATALOG_TAG). invalidate(store) удаляет
+    записи магазина и всего каталога; сохранение товаров вызывает его
+    при смене хэша каталога магазина.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # key -> (тело, заголовки, теги, истекает); порядок — от давно использованных к недавним
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        # Меняется при каждой инвалидации: ответ, начатый до неё, в кэш не попадёт
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.rejected = 0
+
+    def get(self, key):
+        """(тело, заголовки) или None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            body, headers, _, expires_at = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body, headers
+
+    def put(self, key, body: bytes, headers: dict, tags: set, generation: int):
+        with self.lock:
+            if generation != self.generation or len(body) > self.max_bytes:
+                self.rejected += 1
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (body, headers, frozenset(tags), time.monotonic() + self.ttl)
+            self.total_bytes += len(body)
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, store: str = None) -> int:
+        """Удаляет записи магазина и всего каталога (без store — все записи)."""
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+            stale = [
+                key for key, (_, _, tags, _) in self.entries.items()
+                if store is None or CATALOG_TAG in tags or store in tags
+            ]
+            for key in stale:
+                self._remove(key)
+            return len(stale)
+
+    def _remove(self, key):
+        body = self.entries.pop(key)[0]
+        self.total_bytes -= len(body)
+
+    def stats(self) -> dict:
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "size_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "rejected": self.rejected,
+                "hit_ratio": round(self.hits / requests, 3) if requests else None,
+            }
+
+
+def get_catalog_cache():
+    """Общий для процесса кэш ответов каталога или None, если он выключен."""
+    global _cache
+    if not CATALOG_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = CatalogCache(CATALOG_CACHE_MAX_MB * 1024 * 1024, CATALOG_CACHE_TTL)
+    return _cache
+
+
+def invalidate_catalog_cache(store: str = None):
+    cache = get_catalog_cache()
+    if cache:
+        cache.invalidate(store)
+
+
+def get_catalog_cache_stats() -> dict:
+    cache = get_catalog_cache()
+    return cache.stats() if cache else {"enabled": False}
@@ -0,0 +1,118 @@
+import os
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.database import Database
+from services.pagination import HIDDEN_FIELDS
+
+# Сколько дней хранить события ленты изменений
+CATALOG_CHANGES_TTL_DAYS = int(os.getenv("CATALOG_CHANGES_TTL_DAYS", "30"))
+# Через сколько секунд пропуск в номерах считается потерянной записью, а не ещё не вставленной
+CATALOG_CHANGES_GAP_GRACE = int(os.getenv("CATALOG_CHANGES_GAP_GRACE", "30"))
+
+CATALOG_CHANGES = "catalog_changes"
+CATALOG_COUNTERS = "catalog_counters"
+
+# Служебные поля документа магазина, которые в событие не попадают (те же, что скрыты в API)
+EVENT_EXCLUDED_FIELDS = {*HIDDEN_FIELDS, "updated_at"}
+
+_prepared = set()
+
+
+def ensure_catalog_changes(db: Database):
+    """Индексы ленты изменений: уникальный seq и TTL по времени события (один раз на процесс)."""
+    if db.name in _prepared:
+        return
+    db[CATALOG_CHANGES].create_index([("seq", ASCENDING)], unique=True)
+    db[CATALOG_CHANGES].create_index([("ts", ASCENDING)], expireAfterSeconds=CATALOG_CHANGES_TTL_DAYS * 24 * 3600)
+    _prepared.add(db.name)
+
+
+def product_event(store: str, document: dict, is_new: bool, previous_price=None) -> dict:
+    """
+    Событие для нового или изменённого товара: added, price_changed (цена
+    отличается от сохранённой) или updated (изменились другие поля).
+    В событии полный товар, чтобы потребитель мог обновить свою копию.
+    """
+    if is_new:
+        event_type = "added"
+    elif document.get("price_value") != previous_price:
+        event_type = "price_changed"
+    else:
+        event_type = "updated"
+
+    event = {
+        "type": event_type,
+        "store": store,
+        "url": document["_id"],
+        "product": {k: v for k, v in document.items() if k not in EVENT_EXCLUDED_FIELDS},
+    }
+    if event_type == "price_changed":
+        event["previous_price_value"] = previous_price
+    return event
+
+
+def removed_event(store: str, url: str) -> dict:
+    return {"type": "removed", "store": store, "url": url}
+
+
+def record_catalog_changes(db: Database, events: list[dict]) -> int:
+    """
+    Записывает события с последовательными номерами. Диапазон номеров
+    резервируется одним $inc счётчика, поэтому номера растут монотонно
+    и при параллельной записи нескольких магазинов. Возвращает последний номер.
+    """
+    if not events:
+        return 0
+    ensure_catalog_changes(db)
+
+    counter = db[CATALOG_COUNTERS].find_one_and_update(
+        {"_id": CATALOG_CHANGES},
+        {"$inc": {"seq": len(events)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    last_seq = counter["seq"]
+    now = datetime.utcnow()
+    first_seq = last_seq - len(events) + 1
+    db[CATALOG_CHANGES].insert_many(
+        [dict(event, seq=first_seq + i, ts=now) for i, event in enumerate(events)],
+        ordered=False,
+    )
+    return last_seq
+
+
+def read_catalog_changes(db: Database, since: int, limit: int) -> dict:
+    """
+    События с номером больше since, по возрастанию. Чтение останавливается на
+    пропуске в номерах: диапазон уже зарезервирован другим сохранением, но ещё
+    не вставлен. Пропуск старше CATALOG_CHANGES_GAP_GRACE секунд пропускается.
+    reset=True — события после since уже удалены по TTL: копию нужно загрузить
+    заново и продолжить с last_seq (события идемпотентны, повтор не вредит).
+    """
+    collection = db[CATALOG_CHANGES]
+    counter = db[CATALOG_COUNTERS].find_one({"_id": CATALOG_CHANGES})
+    current_seq = counter["seq"] if counter else 0
+
+    # Без событий сброс не нужен: номера могли быть зарезервированы, но ещё не вставлены
+    # (или вставка после $inc не удалась) — тогда ответ пустой, has_more — по счётчику
+    oldest = collection.find_one({}, {"seq": 1}, sort=[("seq", ASCENDING)])
+    if oldest and since < oldest["seq"] - 1:
+        return {"since": since, "last_seq": current_seq, "reset": True, "has_more": False, "changes": []}
+
+    changes = []
+    expected_seq = since + 1
+    grace_border = datetime.utcnow() - timedelta(seconds=CATALOG_CHANGES_GAP_GRACE)
+    for event in collection.find({"seq": {"$gt": since}}, {"_id": 0}, sort=[("seq", ASCENDING)], limit=limit):
+        if event["seq"] != expected_seq and event["ts"] > grace_border:
+            break
+        changes.append(event)
+        expected_seq = event["seq"] + 1
+
+    last_seq = changes[-1]["seq"] if changes else since
+    return {
+        "since": since,
+        "last_seq": last_seq,
+        "reset": False,
+        "has_more": last_seq < current_seq,
+        "changes": changes,
+    }
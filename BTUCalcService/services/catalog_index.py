@@ -0,0 +1,249 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+import numpy as np
+from pymongo.collection import Collection
+from services.catalog_stats import CATALOG_STATS
+from services.db import AsyncCollection, run_in_mongo_thread
+from services.pagination import PageQuery
+
+CATALOG_INDEX_ENABLED = os.getenv("CATALOG_INDEX_ENABLED", "1") == "1"
+# Не чаще чем раз в столько секунд снимок сверяется с catalog_stats.updated_at:
+# так подхватываются записи мимо процесса (например, парсер запущен отдельным скриптом)
+CATALOG_INDEX_CHECK_SECONDS = float(os.getenv("CATALOG_INDEX_CHECK_SECONDS", "30"))
+
+# Числовые поля, по которым индекс отвечает на запросы диапазона
+INDEXED_FIELDS = ("btu_value", "price_value", "service_area_value")
+
+_index = None
+_load_lock = threading.Lock()
+
+
+class CatalogIndex:
+    """
+    Снимок общего каталога в памяти для запросов диапазона по числовым полям.
+
+    Для каждого поля хранится перестановка номеров строк в порядке сортировки
+    MongoDB (сначала товары без значения, затем по значению, при равенстве по _id)
+    и отсортированный массив значений. Диапазон находится двумя бинарными
+    поисками и сразу даёт строки в порядке поля. Ранги строк по каждому полю
+    позволяют пересортировать выборку и применить курсор after векторно.
+    Снимок не меняется после построения; обновление — замена целиком.
+    source_version — catalog_stats.updated_at коллекции на момент построения.
+    """
+
+    def __init__(self, collection_name: str, documents: list[dict], source_version=None):
+        self.collection_name = collection_name
+        self.documents = documents
+        self.source_version = source_version
+        self.checked_at = time.monotonic()
+        self.row_by_id = {document["_id"]: row for row, document in enumerate(documents)}
+
+        count = len(documents)
+        positions = np.arange(count, dtype=np.int32)
+        ids = np.array([str(document["_id"]) for document in documents])
+        self.id_rank = np.empty(count, dtype=np.int32)
+        self.id_rank[np.argsort(ids, kind="stable")] = positions
+
+        self.order, self.rank, self.values, self.nulls = {}, {}, {}, {}
+        for field in INDEXED_FIELDS:
+            raw = [document.get(field) for document in documents]
+            present = np.array([isinstance(value, (int, float)) and not isinstance(value, bool) for value in raw])
+            values = np.array([value if ok else 0 for value, ok in zip(raw, present)], dtype=np.float64)
+
+            # lexsort: последний ключ — главный
+            order = np.lexsort((self.id_rank, values, present)).astype(np.int32)
+            rank = np.empty(count, dtype=np.int32)
+            rank[order] = positions
+
+            self.nulls[field] = count - int(present.sum())
+            self.order[field] = order
+            self.rank[field] = rank
+            self.values[field] = values[order][self.nulls[field]:]
+
+        # Порядок «от дешёвых»: по цене, товары без цены в конце, при равенстве по _id
+        has_price = self.rank["price_value"] >= self.nulls["price_value"]
+        self.price_key = np.where(has_price, self.rank["price_value"], count + self.id_rank)
+
+        # Корзины по значению BTU: строки каждой корзины заранее отсортированы по price_key
+        btu_values = self.values["btu_value"]
+        btu_rows = self.order["btu_value"][self.nulls["btu_value"]:]
+        self.btu_buckets, starts = np.unique(btu_values, return_index=True)
+        bounds = list(starts) + [len(btu_rows)]
+        self.btu_bucket_rows = []
+        for start, stop in zip(bounds, bounds[1:]):
+            rows = btu_rows[start:stop]
+            self.btu_bucket_rows.append(rows[np.argsort(self.price_key[rows], kind="stable")])
+
+    def __len__(self):
+        return len(self.documents)
+
+    def range(self, field: str, low, high) -> np.ndarray:
+        """Номера строк с low <= field <= high в порядке (field, _id)."""
+        values = self.values[field]
+        start = np.searchsorted(values, low, side="left")
+        stop = np.searchsorted(values, high, side="right")
+        offset = self.nulls[field]
+        return self.order[field][offset + start:offset + stop]
+
+    def recommend(self, low, high, target, limit: int, order: str = "price") -> list[dict]:
+        """
+        Первые limit товаров с BTU в [low, high]: order="price" — самые дешёвые,
+        order="fit" — с BTU ближе всего к target, среди равных — дешевле.
+        Корзины диапазона находятся бинарным поиском; внутри корзины строки уже
+        упорядочены по цене, поэтому читаются только первые limit строк.
+        """
+        start = np.searchsorted(self.btu_buckets, low, side="left")
+        stop = np.searchsorted(self.btu_buckets, high, side="right")
+        buckets = range(start, stop)
+
+        def cheapest(group):
+            return heapq.merge(
+                *(self.btu_bucket_rows[bucket][:limit] for bucket in group),
+                key=lambda row: self.price_key[row],
+            )
+
+        if order == "fit":
+            # Корзины на одинаковом расстоянии от target (ниже и выше) сливаются по цене
+            distance = lambda bucket: abs(self.btu_buckets[bucket] - target)
+            groups = itertools.groupby(sorted(buckets, key=distance), key=distance)
+            rows = itertools.chain.from_iterable(cheapest(list(group)) for _, group in groups)
+        else:
+            rows = cheapest(buckets)
+        return [self.documents[row] for row in itertools.islice(rows, limit)]
+
+    def select(self, rows: np.ndarray, page: PageQuery):
+        """
+        Документы выборки в порядке сортировки страницы, после курсора и не больше
+        limit + 1 (лишний показывает, что есть следующая страница).
+        None — курсор указывает на товар, которого нет в снимке или который изменился:
+        такой запрос выполняется в MongoDB.
+        """
+        ranks = self.id_rank if page.sort_field == "_id" else self.rank[page.sort_field]
+        row_ranks = ranks[rows]
+
+        if page.after is not None:
+            value, document_id = page.after
+            cursor_row = self.row_by_id.get(document_id)
+            if cursor_row is None:
+                return None
+            if page.sort_field != "_id" and self.documents[cursor_row].get(page.sort_field) != value:
+                return None
+            keep = row_ranks > ranks[cursor_row] if page.direction > 0 else row_ranks < ranks[cursor_row]
+            rows, row_ranks = rows[keep], row_ranks[keep]
+
+        ordered = rows[np.argsort(row_ranks, kind="stable")]
+        if page.direction < 0:
+            ordered = ordered[::-1]
+        if page.limit:
+            ordered = ordered[:page.limit + 1]
+        return [self.documents[row] for row in ordered]
+
+
+class CatalogIndexStats:
+    def __init__(self):
+        self.builds = 0
+        self.last_build_seconds = None
+        self.loaded_at = None
+        self.queries = 0
+        self.fallbacks = 0
+        self.checks = 0
+        self.stale_rebuilds = 0
+
+    def stats(self) -> dict:
+        index = _index
+        return {
+            "enabled": CATALOG_INDEX_ENABLED,
+            "collection": index.collection_name if index else None,
+            "rows": len(index) if index else 0,
+            "builds": self.builds,
+            "last_build_seconds": self.last_build_seconds,
+            "loaded_at": self.loaded_at,
+            "queries": self.queries,
+            "fallbacks": self.fallbacks,
+            "checks": self.checks,
+            "stale_rebuilds": self.stale_rebuilds,
+            "source_version": index.source_version if index else None,
+        }
+
+
+index_stats = CatalogIndexStats()
+
+
+def _source_version(collection: Collection):
+    """Время последнего пересчёта сводки коллекции: меняется при каждом изменении каталога."""
+    stats = collection.database[CATALOG_STATS].find_one({"_id": collection.name}, {"updated_at": 1})
+    return stats.get("updated_at") if stats else None
+
+
+def build_catalog_index(collection: Collection) -> CatalogIndex:
+    """Читает коллекцию каталога и подменяет текущий снимок новым."""
+    global _index
+    started_at = time.perf_counter()
+    # Версия читается до товаров: запись между чтениями даст лишнюю перестройку, а не устаревший снимок
+    source_version = _source_version(collection)
+    documents = list(collection.find({}, {"content_hash": 0}))
+    index = CatalogIndex(collection.name, documents, source_version)
+    _index = index
+
+    index_stats.builds += 1
+    index_stats.last_build_seconds = round(time.perf_counter() - started_at, 3)
+    index_stats.loaded_at = time.time()
+    print(f"[catalog_index] ✅ {collection.name}: {len(index)} товаров за {index_stats.last_build_seconds} с")
+    return index
+
+
+def _is_checked(index, collection_name: str) -> bool:
+    """Снимок той же коллекции, сверенный с БД не раньше CATALOG_INDEX_CHECK_SECONDS назад."""
+    return (
+        index is not None
+        and index.collection_name == collection_name
+        and time.monotonic() - index.checked_at < CATALOG_INDEX_CHECK_SECONDS
+    )
+
+
+def _load_catalog_index(collection: Collection) -> CatalogIndex:
+    with _load_lock:
+        index = _index
+        if _is_checked(index, collection.name):
+            return index
+        if index is not None and index.collection_name == collection.name:
+            index_stats.checks += 1
+            if _source_version(collection) == index.source_version:
+                index.checked_at = time.monotonic()
+                return index
+            index_stats.stale_rebuilds += 1
+            print(f"[catalog_index] ℹ️ {collection.name} изменилась вне процесса, снимок перестраивается")
+        return build_catalog_index(collection)
+
+
+async def get_catalog_index(collection: AsyncCollection):
+    """
+    Снимок для текущей коллекции каталога или None, если индекс выключен.
+    При первом обращении снимок загружается, затем не чаще раза в
+    CATALOG_INDEX_CHECK_SECONDS сверяется с catalog_stats и при расхождении перестраивается.
+    """
+    if not CATALOG_INDEX_ENABLED:
+        return None
+    index = _index
+    if not _is_checked(index, collection.name):
+        index = await run_in_mongo_thread(_load_catalog_index, collection.delegate)
+    return index
+
+
+def refresh_catalog_index(collection: Collection):
+    """
+    Перестраивает снимок после изменения каталога. Если снимок в этом
+    процессе ещё не загружался (например, парсер запущен отдельным
+    скриптом), ничего не делает: он загрузится при первом запросе.
+    """
+    if not CATALOG_INDEX_ENABLED or _index is None:
+        return
+    with _load_lock:
+        build_catalog_index(collection)
+
+
+def get_catalog_index_stats() -> dict:
+    return index_stats.stats()
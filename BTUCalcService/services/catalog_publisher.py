@@ -0,0 +1,153 @@
+import os
+import re
+import time
+from datetime import datetime
+from pymongo.collection import Collection
+from pymongo.database import Database
+from services.db import AsyncCollection, AsyncDatabase
+from services.catalog_cache import invalidate_catalog_cache
+from services.catalog_index import refresh_catalog_index
+from services.catalog_stats import forget_catalog_stats, refresh_catalog_stats
+from services.indexes import ensure_indexes
+
+# inplace — общая коллекция all_products обновляется по месту при каждом сохранении магазина;
+# versioned — каталог целиком собирается в новую версию all_products_v<N>, и читатели
+# переключаются на неё одной записью в catalog_state, когда версия готова
+CATALOG_PUBLISH_MODE = os.getenv("CATALOG_PUBLISH_MODE", "inplace")
+# Сколько последних версий хранить (текущая и предыдущие — для ещё не завершённых запросов)
+CATALOG_KEEP_VERSIONS = max(2, int(os.getenv("CATALOG_KEEP_VERSIONS", "2")))
+# Как долго процесс API помнит, какая версия текущая (сек)
+CATALOG_POINTER_TTL = float(os.getenv("CATALOG_POINTER_TTL", "5"))
+
+ALL_PRODUCTS = "all_products"
+CATALOG_STATE = "catalog_state"
+VERSION_PATTERN = re.compile(rf"^{ALL_PRODUCTS}_v(\d+)$")
+
+_pointer = {"collection": None, "expires_at": 0.0}
+
+
+def is_versioned_catalog() -> bool:
+    return CATALOG_PUBLISH_MODE == "versioned"
+
+
+def get_catalog_collection(db: Database) -> Collection:
+    """Коллекция, из которой читается общий каталог всех магазинов."""
+    if not is_versioned_catalog():
+        return db[ALL_PRODUCTS]
+
+    now = time.monotonic()
+    if _pointer["collection"] is None or now >= _pointer["expires_at"]:
+        state = db[CATALOG_STATE].find_one({"_id": ALL_PRODUCTS})
+        # До первой публикации читаем старую общую коллекцию
+        _pointer["collection"] = state["collection"] if state else ALL_PRODUCTS
+        _pointer["expires_at"] = now + CATALOG_POINTER_TTL
+    return db[_pointer["collection"]]
+
+
+async def get_async_catalog_collection(db: AsyncDatabase) -> AsyncCollection:
+    """То же для обработчиков API: указатель на версию читается в пуле потоков MongoDB."""
+    if not is_versioned_catalog() or time.monotonic() < _pointer["expires_at"]:
+        return AsyncCollection(get_catalog_collection(db.delegate))
+    return AsyncCollection(await db.run(get_catalog_collection))
+
+
+def get_store_collections(db: Database) -> dict:
+    """Коллекции магазинов: имя магазина → имя коллекции <store>_products."""
+    return {
+        name[:-len("_products")]: name
+        for name in sorted(db.list_collection_names())
+        if name.endswith("_products") and name != ALL_PRODUCTS
+    }
+
+
+def _store_pipeline(store: str) -> list:
+    """Товары одного магазина в виде документов общего каталога (как при записи по месту)."""
+    return [
+        {"$match": {"_id": {"$ne": "metadata"}}},
+        {"$set": {"_id": {"$concat": [f"{store}_", "$url"]}, "source": store}},
+    ]
+
+
+def list_catalog_versions(db: Database) -> list[int]:
+    versions = []
+    for name in db.list_collection_names():
+        match = VERSION_PATTERN.match(name)
+        if match:
+            versions.append(int(match.group(1)))
+    return sorted(versions)
+
+
+def publish_catalog(db: Database, changed: bool = True):
+    """
+    Собирает новую версию общего каталога из коллекций магазинов и делает её текущей.
+    Сборка идёт одним агрегатом ($unionWith + $out) в отдельную коллекцию, затем
+    на ней строятся индексы и сводка catalog_stats; читатели в это время работают
+    с предыдущей версией. Переключение — одна запись в catalog_state, после чего
+    удаляются версии старше CATALOG_KEEP_VERSIONS последних.
+    Возвращает имя текущей коллекции каталога.
+    """
+    state_collection = db[CATALOG_STATE]
+    state = state_collection.find_one({"_id": ALL_PRODUCTS})
+
+    if state and not changed:
+        print(f"[catalog] ℹ️ Магазины не изменились, остаётся версия {state['version']}.")
+        return state["collection"]
+
+    stores = get_store_collections(db)
+    if not stores:
+        print("[catalog] ❌ Нет коллекций магазинов. Публикация пропущена.")
+        return state["collection"] if state else None
+
+    version = (state["version"] if state else 0) + 1
+    target = f"{ALL_PRODUCTS}_v{version}"
+
+    (first_store, first_collection), *other_stores = stores.items()
+    pipeline = _store_pipeline(first_store)
+    for store, collection_name in other_stores:
+        pipeline.append({"$unionWith": {"coll": collection_name, "pipeline": _store_pipeline(store)}})
+    pipeline.append({"$out": target})
+
+    started_at = time.perf_counter()
+    db[first_collection].aggregate(pipeline)
+    count = db[target].estimated_document_count()
+    if not count:
+        print(f"[catalog] ❌ Версия {version} пустая. Текущая версия не меняется.")
+        db.drop_collection(target)
+        return state["collection"] if state else None
+    # $out не переносит индексы — строим их до того, как читатели увидят версию
+    ensure_indexes(db[target])
+    refresh_catalog_stats(db, db[target])
+
+    state_collection.update_one(
+        {"_id": ALL_PRODUCTS},
+        {"$set": {"collection": target, "version": version, "count": count, "published_at": datetime.utcnow()}},
+        upsert=True
+    )
+    _pointer["collection"] = target
+    _pointer["expires_at"] = time.monotonic() + CATALOG_POINTER_TTL
+    refresh_catalog_index(db[target])
+    invalidate_catalog_cache()
+    print(
+        f"[catalog] ✅ Опубликована версия {version}: {count} товаров из {len(stores)} магазинов "
+        f"за {round(time.perf_counter() - started_at, 3)} с"
+    )
+
+    for old_version in list_catalog_versions(db)[:-CATALOG_KEEP_VERSIONS]:
+        if old_version < version:
+            db.drop_collection(f"{ALL_PRODUCTS}_v{old_version}")
+            forget_catalog_stats(db, f"{ALL_PRODUCTS}_v{old_version}")
+            print(f"[catalog] 🗑️ Удалена старая версия {old_version}")
+
+    return target
+
+
+def get_catalog_state(db: Database) -> dict:
+    state = db[CATALOG_STATE].find_one({"_id": ALL_PRODUCTS}, {"_id": 0}) if is_versioned_catalog() else None
+    return {
+        "mode": CATALOG_PUBLISH_MODE,
+        "collection": state["collection"] if state else ALL_PRODUCTS,
+        "version": state.get("version") if state else None,
+        "count": state.get("count") if state else None,
+        "published_at": state.get("published_at") if state else None,
+        "versions": list_catalog_versions(db) if is_versioned_catalog() else [],
+    }
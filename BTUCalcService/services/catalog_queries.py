@@ -0,0 +1,68 @@
+"""
+Фильтры запросов к общему каталогу. Их используют эндпоинты и сохранение,
+а services.indexes проверяет по ним планы запросов, поэтому фильтр
+описывается в одном месте.
+"""
+
+# Поиск по площади захватывает кондиционеры в диапазоне ±SERVICE_AREA_TOLERANCE м²
+SERVICE_AREA_TOLERANCE = 5
+
+# Поля каталога для фильтров поиска: параметр → поле документа, название в ошибке
+SEARCH_RANGES = (
+    ("btu", "btu_value", "BTU"),
+    ("price", "price_value", "цены"),
+    ("area", "service_area_value", "площади"),
+)
+
+
+def btu_range_filter(btu_min, btu_max) -> dict:
+    return {"btu_value": {"$gte": btu_min, "$lte": btu_max}}
+
+
+def btu_filter(btu) -> dict:
+    return {"btu_value": btu}
+
+
+def service_area_bounds(area: int) -> tuple:
+    return area - SERVICE_AREA_TOLERANCE, area + SERVICE_AREA_TOLERANCE
+
+
+def service_area_filter(area: int) -> dict:
+    low, high = service_area_bounds(area)
+    return {"service_area_value": {"$gte": low, "$lte": high}}
+
+
+def price_filter(price) -> dict:
+    return {"price_value": price}
+
+
+def price_range_filter(price_min, price_max) -> dict:
+    return {"price_value": {"$gte": price_min, "$lte": price_max}}
+
+
+def store_filter(store: str) -> dict:
+    """Строки магазина в общем каталоге."""
+    return {"source": store}
+
+
+def search_filter(bounds: dict, stores: list[str] = None) -> dict:
+    """
+    Фильтр /products/search: bounds — параметр из SEARCH_RANGES → (от, до),
+    любая граница может быть None. Нижняя граница больше верхней — ValueError.
+    """
+    query = {}
+    for param, field, label in SEARCH_RANGES:
+        low, high = bounds.get(param, (None, None))
+        if low is not None and high is not None and low > high:
+            raise ValueError(f"Минимальное значение {label} не может быть больше максимального")
+        condition = {}
+        if low is not None:
+            condition["$gte"] = low
+        if high is not None:
+            condition["$lte"] = high
+        if condition:
+            query[field] = condition
+
+    if stores:
+        query["source"] = {"$in": stores}
+    return query
@@ -0,0 +1,124 @@
+import re
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+# Версия вычисляемых полей товара; входит в content_hash, поэтому после её
+# изменения следующее сохранение перезапишет все товары с новыми полями
+CATALOG_SCHEMA_VERSION = 2
+
+# Числовые поля, которые сохранение добавляет к данным парсера
+NUMERIC_FIELDS = {"btu": "btu_value", "price": "price_value", "service_area": "service_area_value"}
+
+CATALOG_STATS = "catalog_stats"
+
+# Поля товара в ответе /extremes/
+EXTREME_PRODUCT_FIELDS = {"btu_value": 1, "name": 1, "price": 1, "currency": 1, "service_area": 1, "store": 1, "url": 1}
+
+# Пробел (в том числе неразрывный) между разрядами: "12 000"
+THOUSANDS_SEPARATOR = re.compile(r"(?<=\d)\s(?=\d{3}(?!\d))")
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def to_number(value):
+    """Число из int/float или строки вида "12 000 BTU", "25,5 м²"; иначе None."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if not isinstance(value, str):
+        return None
+
+    match = NUMBER_PATTERN.search(THOUSANDS_SEPARATOR.sub("", value))
+    if not match:
+        return None
+    number = float(match.group().replace(",", "."))
+    return int(number) if number.is_integer() else number
+
+
+def numeric_fields(product: dict) -> dict:
+    """btu_value (целое), price_value и service_area_value для документа товара."""
+    btu = to_number(product.get("btu"))
+    return {
+        "btu_value": int(round(btu)) if btu is not None else None,
+        "price_value": to_number(product.get("price")),
+        "service_area_value": to_number(product.get("service_area")),
+    }
+
+
+def catalog_schema_outdated(db: Database, collection: Collection) -> bool:
+    """Сводки коллекции каталога нет или она собрана до текущей CATALOG_SCHEMA_VERSION."""
+    stats = db[CATALOG_STATS].find_one({"_id": collection.name}, {"schema_version": 1})
+    return stats is None or stats.get("schema_version", 0) < CATALOG_SCHEMA_VERSION
+
+
+def backfill_numeric_fields(collection: Collection, batch_size: int = 1000) -> int:
+    """
+    Дописывает числовые поля товарам, сохранённым до их появления. content_hash
+    не меняется: из-за новой CATALOG_SCHEMA_VERSION следующее сохранение всё равно
+    перезапишет эти товары целиком. Возвращает число обновлённых документов.
+    """
+    updated = 0
+    operations = []
+    query = {"_id": {"$ne": "metadata"}, "btu_value": {"$exists": False}}
+    for document in collection.find(query, {"btu": 1, "price": 1, "service_area": 1}):
+        operations.append(UpdateOne({"_id": document["_id"]}, {"$set": numeric_fields(document)}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+
+def _bound(collection: Collection, field: str, direction: int):
+    document = collection.find_one({field: {"$ne": None}}, {field: 1}, sort=[(field, direction)])
+    return document[field] if document else None
+
+
+def compute_catalog_stats(collection: Collection) -> dict:
+    """
+    Сводка по коллекции каталога: крайние BTU вместе с товарами, границы цен,
+    число товаров по магазинам. Границы берутся по индексам (сортировка + limit 1),
+    подсчёт по магазинам — одна группировка.
+    """
+    btu_min = _bound(collection, "btu_value", ASCENDING)
+    btu_max = _bound(collection, "btu_value", DESCENDING)
+
+    extreme_products = []
+    if btu_min is not None:
+        for product in collection.find({"btu_value": {"$in": [btu_min, btu_max]}}, EXTREME_PRODUCT_FIELDS):
+            product["btu"] = product.pop("btu_value")
+            extreme_products.append(product)
+
+    counts = {
+        str(row["_id"]): row["count"]
+        for row in collection.aggregate([{"$group": {"_id": "$source", "count": {"$sum": 1}}}])
+    }
+
+    return {
+        "btu_min": btu_min,
+        "btu_max": btu_max,
+        "extreme_products": extreme_products,
+        "price_min": _bound(collection, "price_value", ASCENDING),
+        "price_max": _bound(collection, "price_value", DESCENDING),
+        "counts_by_store": counts,
+        "total": sum(counts.values()),
+        "schema_version": CATALOG_SCHEMA_VERSION,
+    }
+
+
+def refresh_catalog_stats(db: Database, collection: Collection) -> dict:
+    """Пересчитывает сводку коллекции каталога и сохраняет её в catalog_stats под именем коллекции."""
+    stats = compute_catalog_stats(collection)
+    db[CATALOG_STATS].replace_one(
+        {"_id": collection.name},
+        dict(stats, updated_at=datetime.utcnow()),
+        upsert=True
+    )
+    return stats
+
+
+def forget_catalog_stats(db: Database, collection_name: str):
+    db[CATALOG_STATS].delete_one({"_id": collection_name})
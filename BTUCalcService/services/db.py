@@ -1,8 +1,254 @@
+import asyncio
+import itertools
 import os
-from pymongo import MongoClient
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, monitoring
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "btu_database")
+# Пул соединений общего клиента
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+# Тайм-ауты (мс): ожидание свободного соединения, выбор сервера, подключение, операция
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+# primary, primaryPreferred, secondary, secondaryPreferred, nearest
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# Потоки для запросов к MongoDB из асинхронных обработчиков API
+MONGO_THREADS = int(os.getenv("MONGO_THREADS", "32"))
+
+_client = None
+_client_lock = threading.Lock()
+_executor = None
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    Метрики пула соединений общего клиента: сколько соединений открыто и занято,
+    сколько раз и как долго запросы ждали свободное соединение.
+    Начало ожидания запоминается по потоку: выдача соединения идёт в том же потоке.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.open = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.pool_clears = 0
+
+    def connection_check_out_started(self, event):
+        self.local.started_at = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait = time.perf_counter() - getattr(self.local, "started_at", time.perf_counter())
+        with self.lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self.lock:
+            self.created += 1
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.closed += 1
+            self.open -= 1
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.pool_clears += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "open": self.open,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "utilization": round(self.in_use / MONGO_MAX_POOL_SIZE, 3) if MONGO_MAX_POOL_SIZE else None,
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_checkout_wait_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else None,
+                "max_checkout_wait_ms": round(self.wait_max * 1000, 3),
+                "pool_clears": self.pool_clears,
+            }
+
+
+pool_stats = PoolStats()
+
+
+def connect_mongo() -> MongoClient:
+    """
+    Общий для процесса клиент MongoDB (создаётся один раз, дальше переиспользуется).
+    В сервисе им владеет lifespan FastAPI, отдельные скрипты получают его при первом обращении.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(
+                MONGO_URL,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                readPreference=MONGO_READ_PREFERENCE,
+                appname="BTUCalcService",
+                event_listeners=[pool_stats],
+            )
+        return _client
+
 
 def get_mongo_client():
-    client = MongoClient(MONGO_URL)
-    return client["btu_database"]
+    return connect_mongo()[MONGO_DB_NAME]
+
+
+def close_mongo():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get_mongo_pool_stats() -> dict:
+    return {"connected": _client is not None, "read_preference": MONGO_READ_PREFERENCE, **pool_stats.stats()}
+
+
+def get_mongo_executor():
+    """
+    Отдельный пул потоков для pymongo: запросы API не конкурируют за потоки
+    с asyncio.to_thread (сохранение товаров, разбор страниц и т. п.).
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MONGO_THREADS, thread_name_prefix="mongo")
+    return _executor
+
+
+async def run_in_mongo_thread(func, *args, **kwargs):
+    """Выполняет синхронный вызов pymongo в пуле потоков, не блокируя event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_mongo_executor(), lambda: func(*args, **kwargs))
+
+
+class AsyncCollection:
+    """
+    Асинхронная обёртка над коллекцией pymongo. Курсоры вычитываются целиком
+    в потоке пула, поэтому find и aggregate сразу возвращают списки документов.
+    """
+
+    def __init__(self, collection):
+        self.delegate = collection
+
+    @property
+    def name(self) -> str:
+        return self.delegate.name
+
+    async def find(self, *args, **kwargs) -> list:
+        return await run_in_mongo_thread(lambda: list(self.delegate.find(*args, **kwargs)))
+
+    async def stream(self, *args, batch_size: int = 200, **kwargs):
+        """
+        Документы find по мере чтения курсора: в поток пула уходит выборка
+        очередной пачки, поэтому в памяти держится не больше batch_size документов.
+        """
+        cursor = self.delegate.find(*args, batch_size=batch_size, **kwargs)
+        try:
+            while True:
+                batch = await run_in_mongo_thread(lambda: list(itertools.islice(cursor, batch_size)))
+                for document in batch:
+                    yield document
+                if len(batch) < batch_size:
+                    return
+        finally:
+            # На живом курсоре close() отправляет killCursors — тоже не в event loop
+            await run_in_mongo_thread(cursor.close)
+
+    async def find_one(self, *args, **kwargs):
+        return await run_in_mongo_thread(self.delegate.find_one, *args, **kwargs)
+
+    async def aggregate(self, pipeline: list, **kwargs) -> list:
+        return await run_in_mongo_thread(lambda: list(self.delegate.aggregate(pipeline, **kwargs)))
+
+    async def count_documents(self, filter: dict, **kwargs) -> int:
+        return await run_in_mongo_thread(self.delegate.count_documents, filter, **kwargs)
+
+
+class AsyncDatabase:
+    """
+    Асинхронная обёртка над базой pymongo для обработчиков API.
+    Без явной базы берётся база общего клиента на момент обращения, поэтому
+    обёртку можно создать при импорте модуля, до запуска lifespan.
+    """
+
+    def __init__(self, database=None):
+        self.database = database
+
+    @property
+    def delegate(self):
+        return self.database if self.database is not None else get_mongo_client()
+
+    def __getitem__(self, name: str) -> AsyncCollection:
+        return AsyncCollection(self.delegate[name])
+
+    async def list_collection_names(self) -> list:
+        return await run_in_mongo_thread(self.delegate.list_collection_names)
+
+    async def command(self, *args, **kwargs):
+        return await run_in_mongo_thread(self.delegate.command, *args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        """Выполняет func(синхронная база, *args) в пуле потоков MongoDB."""
+        return await run_in_mongo_thread(func, self.delegate, *args, **kwargs)
+
+
+def get_async_mongo_client() -> AsyncDatabase:
+    return AsyncDatabase()
+
+
+def shutdown_mongo_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+# live — обычная работа, record — работа с записью всех ответов в архив,
+# replay — ответы только из архива, без сети
+PARSER_HTTP_MODE = os.getenv("PARSER_HTTP_MODE", "live")
+PARSER_HTTP_ARCHIVE = os.getenv("PARSER_HTTP_ARCHIVE", "http_archive.db")
+# Искусственная задержка ответа в режиме replay (мс) и её случайный разброс
+PARSER_REPLAY_LATENCY_MS = float(os.getenv("PARSER_REPLAY_LATENCY_MS", "0"))
+PARSER_REPLAY_JITTER_MS = float(os.getenv("PARSER_REPLAY_JITTER_MS", "0"))
+# Сколько записанных ответов накапливается перед одной транзакцией SQLite
+PARSER_ARCHIVE_BATCH = int(os.getenv("PARSER_ARCHIVE_BATCH", "50"))
+
+_archive = None
+
+
+class ArchiveMiss(Exception):
+    """В режиме replay запрошен url, которого нет в архиве."""
+
+    def __init__(self, url: str):
+        super().__init__(f"нет ответа в архиве для {url}")
+        self.url = url
+
+
+class HttpArchive:
+    """
+    Архив ответов магазинов url → (статус, тело) в одном файле SQLite.
+    Тела хранятся сжатыми zlib, повторная запись того же url заменяет ответ.
+    Запись копится пачками по batch_size и уходит в SQLite одной транзакцией
+    в отдельном потоке, чтобы не блокировать цикл событий.
+    """
+
+    def __init__(self, path: str, latency_ms: float = 0, jitter_ms: float = 0, batch_size: int = PARSER_ARCHIVE_BATCH):
+        self.path = path
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.batch_size = max(1, batch_size)
+        self.pending = []
+        # Соединение используется из потоков asyncio.to_thread, доступ — под блокировкой
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, status INTEGER NOT NULL, body BLOB NOT NULL, recorded_at TEXT NOT NULL)"
+        )
+        self.connection.commit()
+
+        self.recorded = 0
+        self.replayed = 0
+        self.missing = 0
+
+    async def record(self, url: str, status: int, text: str):
+        self.pending.append((url, status, text, datetime.utcnow().isoformat()))
+        self.recorded += 1
+        if len(self.pending) >= self.batch_size:
+            rows, self.pending = self.pending, []
+            await asyncio.to_thread(self.write, rows)
+
+    def write(self, rows: list):
+        """Сжимает и записывает пачку ответов одной транзакцией."""
+        rows = [(url, status, zlib.compress((text or "").encode("utf-8"), 6), recorded_at)
+                for url, status, text, recorded_at in rows]
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO responses (url, status, body, recorded_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self.connection.commit()
+
+    def flush(self):
+        """Дописывает накопленные ответы (при остановке)."""
+        rows, self.pending = self.pending, []
+        if rows:
+            self.write(rows)
+
+    def lookup(self, url: str):
+        with self.lock:
+            row = self.connection.execute("SELECT status, body FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        status, body = row
+        return status, zlib.decompress(body).decode("utf-8")
+
+    async def replay(self, url: str):
+        """Ответ из архива с заданной задержкой; отсутствующий url — ArchiveMiss."""
+        delay_ms = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+
+        response = await asyncio.to_thread(self.lookup, url)
+        if response is None:
+            self.missing += 1
+            raise ArchiveMiss(url)
+
+        self.replayed += 1
+        return response
+
+    def stats(self) -> dict:
+        with self.lock:
+            count, size = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM responses"
+            ).fetchone()
+        return {
+            "mode": PARSER_HTTP_MODE,
+            "path": self.path,
+            "responses": count,
+            "compressed_bytes": size,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "missing": self.missing,
+            "pending": len(self.pending),
+        }
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def get_http_archive():
+    """Общий архив ответов в режимах record/replay, иначе None."""
+    global _archive
+    if PARSER_HTTP_MODE not in ("record", "replay"):
+        return None
+    if _archive is None:
+        _archive = HttpArchive(PARSER_HTTP_ARCHIVE, PARSER_REPLAY_LATENCY_MS, PARSER_REPLAY_JITTER_MS)
+    return _archive
+
+
+def is_replay_mode() -> bool:
+    return PARSER_HTTP_MODE == "replay"
+
+
+async def flush_http_archive():
+    """Дописывает накопленные ответы в конце обхода, не дожидаясь остановки процесса."""
+    if _archive is not None and _archive.pending:
+        # Пачка забирается в цикле событий, чтобы не разойтись с параллельными record
+        rows, _archive.pending = _archive.pending, []
+        await asyncio.to_thread(_archive.write, rows)
+
+
+def close_http_archive():
+    global _archive
+    if _archive is not None:
+        _archive.close()
+        _archive = None
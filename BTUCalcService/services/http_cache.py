@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "1") == "1"
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", ".http_cache")
+HTTP_CACHE_MAX_MB = int(os.getenv("HTTP_CACHE_MAX_MB", "256"))
+
+_cache = None
+_init_lock = threading.Lock()
+
+
+class HttpCache:
+    """
+    Дисковый кэш страниц магазинов для условных запросов.
+    Хранит тело ответа и валидаторы (ETag / Last-Modified); при ответе 304
+    страница берётся из локальной копии. Размер ограничен, вытесняются
+    давно не использованные записи (LRU по времени последнего обращения).
+
+    Методы читают и пишут файлы, поэтому парсеры вызывают их через
+    asyncio.to_thread; индекс записей меняется под блокировкой.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # key -> размер файла; порядок — от давно использованных к недавним
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+        self._load_index()
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.page"
+
+    def _load_index(self):
+        files = sorted(self.directory.glob("*.page"), key=lambda path: path.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self.entries[path.stem] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _read(self, key: str, with_body: bool = True):
+        try:
+            with open(self._path(key), "rb") as file:
+                meta = json.loads(file.readline())
+                body = file.read().decode("utf-8") if with_body else None
+            return meta, body
+        except (OSError, ValueError):
+            self._remove(key)
+            return None, None
+
+    def _remove(self, key: str):
+        with self.lock:
+            size = self.entries.pop(key, None)
+            if size is not None:
+                self.total_bytes -= size
+        self._unlink(key)
+
+    def _unlink(self, key: str):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while True:
+            with self.lock:
+                if self.total_bytes <= self.max_bytes or not self.entries:
+                    return
+                key, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+            self._unlink(key)
+
+    def validators(self, url: str) -> dict:
+        """Заголовки условного запроса для url, если есть сохранённая копия."""
+        key = self._key(url)
+        if key not in self.entries:
+            return {}
+
+        meta, _ = self._read(key, with_body=False)
+        if not meta:
+            return {}
+
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def load(self, url: str):
+        """Отдаёт сохранённую страницу после ответа 304 и отмечает её как недавно использованную."""
+        key = self._key(url)
+        _, body = self._read(key)
+        if body is None:
+            return None
+
+        with self.lock:
+            self.hits += 1
+            if key in self.entries:
+                self.bytes_saved += self.entries[key]
+                self.entries.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return body
+
+    def store(self, url: str, text: str, headers, revalidated: bool = False):
+        """Сохраняет ответ 200, если сервер прислал хотя бы один валидатор."""
+        with self.lock:
+            if revalidated:
+                self.stale += 1
+            else:
+                self.misses += 1
+
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        key = self._key(url)
+        if not etag and not last_modified:
+            self._remove(key)
+            return
+
+        meta = {"url": url, "etag": etag, "last_modified": last_modified}
+        data = json.dumps(meta, ensure_ascii=False).encode() + b"\n" + text.encode("utf-8")
+
+        # Свой временный файл на каждую запись: параллельные store одного url не смешают тела
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.directory, prefix=f"{key}.", suffix=".tmp", delete=False) as file:
+                tmp_path = file.name
+                file.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"[ОШИБКА] Не удалось сохранить страницу {url} в кэш: {e}")
+            if tmp_path:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            return
+
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+        self._evict()
+
+    def forget(self, url: str):
+        self._remove(self._key(url))
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses + self.stale
+        return {
+            "entries": len(self.entries),
+            "size_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "bytes_saved": self.bytes_saved,
+            "hit_ratio": round(self.hits / requests, 3) if requests else None,
+        }
+
+
+def get_http_cache():
+    """Общий для процесса кэш страниц или None, если он выключен."""
+    global _cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                _cache = HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
+
+
+async def get_http_cache_async():
+    """То же, что get_http_cache, но первое чтение каталога кэша выполняется в потоке."""
+    if _cache is None and HTTP_CACHE_ENABLED:
+        return await asyncio.to_thread(get_http_cache)
+    return get_http_cache()
+
+
+def get_http_cache_stats() -> dict:
+    if not HTTP_CACHE_ENABLED:
+        return {"enabled": False}
+    # Статистика не загружает кэш сама: до первого запроса парсера он пуст
+    return _cache.stats() if _cache else {"enabled": True, "loaded": False}
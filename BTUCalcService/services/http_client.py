@@ -0,0 +1,135 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+import aiohttp
+from aiohttp.compression_utils import HAS_BROTLI
+from services.rate_limiter import RATE_LIMIT_MAX_CONCURRENCY
+
+# Общий пул соединений для всех парсеров. Параллелизм на хост регулирует
+# ограничитель (services.rate_limiter), пул лишь не должен быть уже его предела
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "64"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", str(RATE_LIMIT_MAX_CONCURRENCY)))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "3600"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "75"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "Mozilla/5.0 (compatible; BTUCalcService/1.0)")
+
+_session = None
+_session_loop = None
+
+
+class HttpStats:
+    """Накопительная статистика общего HTTP-клиента."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+        # bytes_wire — размер тела по Content-Length (сжатый), bytes_decoded — после распаковки
+        self.bytes_wire = 0
+        self.bytes_decoded = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+            "bytes_wire": self.bytes_wire,
+            "bytes_decoded": self.bytes_decoded,
+            "compression_ratio": round(self.bytes_decoded / self.bytes_wire, 2) if self.bytes_wire else None,
+        }
+
+
+stats = HttpStats()
+
+
+def _build_trace_config() -> aiohttp.TraceConfig:
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_connection_create_end(session, ctx, params):
+        stats.connections_opened += 1
+
+    async def on_connection_reuseconn(session, ctx, params):
+        stats.connections_reused += 1
+
+    async def on_dns_cache_hit(session, ctx, params):
+        stats.dns_cache_hits += 1
+
+    async def on_dns_cache_miss(session, ctx, params):
+        stats.dns_cache_misses += 1
+
+    async def on_request_end(session, ctx, params):
+        stats.requests += 1
+        content_length = params.response.headers.get("Content-Length")
+        if content_length and content_length.isdigit():
+            stats.bytes_wire += int(content_length)
+        else:
+            # Без Content-Length (chunked) считаем по фактически полученным данным
+            ctx.count_chunks = True
+
+    async def on_response_chunk_received(session, ctx, params):
+        stats.bytes_decoded += len(params.chunk)
+        if getattr(ctx, "count_chunks", False):
+            stats.bytes_wire += len(params.chunk)
+
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    return trace_config
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        enable_cleanup_closed=True,
+    )
+    accept_encoding = "gzip, deflate, br" if HAS_BROTLI else "gzip, deflate"
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        headers={"Accept-Encoding": accept_encoding, "User-Agent": HTTP_USER_AGENT},
+        trace_configs=[_build_trace_config()],
+    )
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """
+    Возвращает общую для процесса сессию. Она живёт между запусками парсеров,
+    поэтому DNS-кэш и открытые keep-alive соединения переиспользуются.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = _create_session()
+        _session_loop = loop
+    return _session
+
+
+@asynccontextmanager
+async def http_session():
+    """Одалживает общую сессию на время работы парсера, не закрывая её."""
+    yield await get_http_session()
+
+
+async def close_http_session():
+    """Закрывает общую сессию (при остановке сервиса или в конце скрипта)."""
+    global _session, _session_loop
+    if _session is not None and not _session.closed and _session_loop is asyncio.get_running_loop():
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+def get_http_stats() -> dict:
+    return stats.as_dict()
@@ -0,0 +1,147 @@
+"""
+Индексы общего каталога под запросы API и сохранения.
+
+    python -m services.indexes            # создать индексы и показать отчёт
+    python -m services.indexes --explain  # проверить планы запросов; код 1, если есть полный просмотр коллекции
+"""
+import argparse
+import sys
+from pymongo import ASCENDING, IndexModel
+from pymongo.collection import Collection
+from services.catalog_queries import (
+    btu_filter, btu_range_filter, price_filter, price_range_filter, search_filter, service_area_filter, store_filter,
+)
+
+# Индексы общего каталога: имя → ключи
+CATALOG_INDEXES = {
+    # /range/, /btu/{btu}, крайние BTU в catalog_stats; префикс btu_value обслуживает и запросы только по BTU
+    "btu_value_1_price_value_1": [("btu_value", ASCENDING), ("price_value", ASCENDING)],
+    # /price/{price}, /price/, границы цен в catalog_stats
+    "price_value_1": [("price_value", ASCENDING)],
+    # /service_area/{area}
+    "service_area_value_1": [("service_area_value", ASCENDING)],
+    # /products/search по магазинам (сортировка по цене по умолчанию); префикс source —
+    # выборка строк магазина при сохранении
+    "source_1_price_value_1": [("source", ASCENDING), ("price_value", ASCENDING)],
+}
+
+# Индексы прежних версий: ensure_indexes удаляет их, если они остались в коллекции
+OBSOLETE_INDEXES = {
+    # До числовых полей btu_value/price_value/service_area_value
+    "btu_1_price_1",
+    "price_1",
+    "service_area_1",
+    "store_1_price_1",
+    # Поле store в общем каталоге есть, но ни один запрос по нему не фильтрует: магазин выбирается по source
+    "store_1_price_value_1",
+    # Покрывается префиксом source_1_price_value_1
+    "source_1",
+}
+
+# Фильтры, которые используют эндпоинты и сохранение (из тех же функций): для проверки планов
+CATALOG_QUERIES = {
+    "/products/range/": btu_range_filter(9000, 12000),
+    "/products/btu/{btu}": btu_filter(12000),
+    "/products/service_area/{area}": service_area_filter(25),
+    "/products/price/{price}": price_filter(10000),
+    "/products/price/": price_range_filter(5000, 15000),
+    "/products/search": search_filter({"btu": (9000, 12000), "price": (None, 15000)}, ["gree", "jara"]),
+    "/products/search?store=": search_filter({}, ["gree", "jara"]),
+    "saver: source": store_filter("jara"),
+}
+
+
+def ensure_indexes(collection: Collection) -> list[str]:
+    """
+    Создаёт недостающие индексы каталога и удаляет устаревшие из OBSOLETE_INDEXES
+    (повторный вызов ничего не меняет). Возвращает имена созданных индексов.
+    """
+    existing = set(collection.index_information())
+    for name in sorted(OBSOLETE_INDEXES & existing):
+        collection.drop_index(name)
+        print(f"[indexes] 🗑️ {collection.name}: удалён устаревший индекс {name}")
+
+    models = [IndexModel(keys, name=name) for name, keys in CATALOG_INDEXES.items() if name not in existing]
+    if not models:
+        return []
+    created = collection.create_indexes(models)
+    print(f"[indexes] ✅ {collection.name}: созданы индексы {', '.join(created)}")
+    return created
+
+
+def index_report(collection: Collection) -> dict:
+    """
+    Отчёт по индексам: каких объявленных не хватает, какие не использовались
+    с последнего запуска сервера MongoDB ($indexStats) и какие не объявлены здесь.
+    """
+    existing = set(collection.index_information()) - {"_id_"}
+    usage = {}
+    try:
+        for stat in collection.aggregate([{"$indexStats": {}}]):
+            usage[stat["name"]] = stat["accesses"]["ops"]
+    except Exception as e:
+        print(f"[indexes] ⚠️ Нет статистики использования индексов {collection.name}: {e}")
+
+    return {
+        "collection": collection.name,
+        "missing": sorted(set(CATALOG_INDEXES) - existing),
+        "unused": sorted(name for name in existing if usage.get(name) == 0),
+        "undeclared": sorted(existing - set(CATALOG_INDEXES)),
+        "usage": usage,
+    }
+
+
+def _plan_stages(plan: dict):
+    """Все стадии плана запроса (дерево inputStage/inputStages)."""
+    yield plan
+    if "inputStage" in plan:
+        yield from _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def explain_queries(collection: Collection) -> dict:
+    """Выигравший план для каждого запроса каталога: индекс или полный просмотр."""
+    plans = {}
+    for query_name, query in CATALOG_QUERIES.items():
+        winning_plan = collection.find(query).explain()["queryPlanner"]["winningPlan"]
+        # В новых версиях MongoDB план SBE вложен в queryPlan
+        winning_plan = winning_plan.get("queryPlan", winning_plan)
+        stages = list(_plan_stages(winning_plan))
+        plans[query_name] = {
+            "collection_scan": any(stage.get("stage") == "COLLSCAN" for stage in stages),
+            "indexes": sorted({stage["indexName"] for stage in stages if "indexName" in stage}),
+        }
+    return plans
+
+
+def main():
+    from services.catalog_publisher import get_catalog_collection
+    from services.db import close_mongo, get_mongo_client
+
+    parser = argparse.ArgumentParser(description="Индексы общего каталога")
+    parser.add_argument("--explain", action="store_true", help="проверить, что запросы идут по индексам")
+    args = parser.parse_args()
+
+    db = get_mongo_client()
+    collection = get_catalog_collection(db)
+    try:
+        ensure_indexes(collection)
+        print(index_report(collection))
+        if not args.explain:
+            return
+
+        failed = []
+        for query_name, plan in explain_queries(collection).items():
+            status = "❌ COLLSCAN" if plan["collection_scan"] else f"✅ {', '.join(plan['indexes']) or 'EOF'}"
+            print(f"{query_name:<32} {status}")
+            if plan["collection_scan"]:
+                failed.append(query_name)
+        if failed:
+            sys.exit(1)
+    finally:
+        close_mongo()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,100 @@
+import asyncio
 import hashlib
 import json
+import logging
+import os
+import time
 from datetime import datetime
 from pymongo.collection import Collection
 from pymongo.database import Database
 from pymongo.errors import BulkWriteError
-from pymongo import ReplaceOne
+from pymongo import DeleteMany, InsertOne, ReplaceOne
+from services.catalog_publisher import get_catalog_collection, is_versioned_catalog
+from services.catalog_cache import invalidate_catalog_cache
+from services.catalog_changes import product_event, record_catalog_changes, removed_event
+from services.catalog_index import refresh_catalog_index
+from services.catalog_queries import store_filter
+from services.catalog_stats import CATALOG_SCHEMA_VERSION, NUMERIC_FIELDS, numeric_fields, refresh_catalog_stats
+from services.price_history import record_product_changes, record_store_prices
 
+logger = logging.getLogger(__name__)
 
-def calculate_overall_hash(products: list[dict]) -> str:
+# Размер пачки товаров для потоковой записи
+SAVE_CHUNK_SIZE = int(os.getenv("SAVE_CHUNK_SIZE", "100"))
+# unordered — хэш каталога не зависит от порядка товаров, ordered — зависит (как раньше)
+CATALOG_HASH_MODE = os.getenv("CATALOG_HASH_MODE", "unordered")
+
+# Служебные и вычисляемые поля, не влияющие на хэш каталога
+HASH_EXCLUDED_FIELDS = {"_id", "hash", "updated_at", "content_hash", *NUMERIC_FIELDS.values()}
+
+
+class CatalogHasher:
+    """
+    Потоковый хэш каталога: товары добавляются по одному, без копии всего списка.
+    В режиме ordered результат совпадает с SHA-256 от JSON-списка товаров.
+    В режиме unordered хэш каждого товара складывается по модулю 2^256, поэтому
+    перестановка товаров между страницами каталога не меняет итог, а повтор
+    одного товара — меняет.
+    """
+
+    def __init__(self, ordered: bool = None):
+        self.ordered = CATALOG_HASH_MODE == "ordered" if ordered is None else ordered
+        self.count = 0
+        self.total = 0
+        self.hasher = hashlib.sha256(b"[")
+
+    def update(self, product: dict):
+        data = serialize_product(product)
+        if self.ordered:
+            if self.count:
+                self.hasher.update(b", ")
+            self.hasher.update(data)
+        else:
+            self.total = (self.total + int.from_bytes(hashlib.sha256(data).digest(), "big")) % (1 << 256)
+        self.count += 1
+
+    def hexdigest(self) -> str:
+        if self.ordered:
+            hasher = self.hasher.copy()
+            hasher.update(b"]")
+            return hasher.hexdigest()
+        return f"{self.total:064x}"
+
+
+def calculate_overall_hash(products, ordered: bool = None) -> str:
     """Вычисляет хэш всех товаров."""
-    data_to_hash = []
+    hasher = CatalogHasher(ordered)
     for product in products:
-        clean_product = {k: v for k, v in product.items() if k not in {"_id", "hash", "updated_at"}}
-        data_to_hash.append(clean_product)
+        hasher.update(product)
+    return hasher.hexdigest()
+
 
-    data_string = json.dumps(data_to_hash, sort_keys=True, ensure_ascii=False)
-    return hashlib.sha256(data_string.encode()).hexdigest()
+def serialize_product(product: dict) -> bytes:
+    """Содержимое товара без служебных полей в каноническом JSON."""
+    clean_product = {k: v for k, v in product.items() if k not in HASH_EXCLUDED_FIELDS}
+    return json.dumps(clean_product, sort_keys=True, ensure_ascii=False).encode()
+
+
+def calculate_product_hash(product: dict) -> str:
+    """
+    Хэш содержимого одного товара; хранится в документе как content_hash.
+    Включает версию вычисляемых полей, чтобы их изменение обновило все документы.
+    """
+    return hashlib.sha1(f"{CATALOG_SCHEMA_VERSION}:".encode() + serialize_product(product)).hexdigest()
 
 
 class MongoDBParserSaver:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, write_all_products: bool = None):
         self.db = db
+        # В режиме versioned общий каталог собирается из коллекций магазинов при публикации
+        self.write_all_products = not is_versioned_catalog() if write_all_products is None else write_all_products
 
     def save_products(self, parser_name: str, products: list[dict]) -> bool:
-        """Сохраняет продукты в базу данных."""
+        """
+        Сохраняет продукты в базу данных.
+        Пишутся только отличия от сохранённого каталога: новые товары вставляются,
+        изменённые (по content_hash) заменяются, пропавшие удаляются.
+        """
         collection: Collection = self.db[f"{parser_name}_products"]
         all_products_collection: Collection = self.db["all_products"]
 
@@ -44,58 +115,343 @@ class MongoDBParserSaver:
 
         print(f"[{parser_name}] 🔁 Хэш изменился. Начинаем обновление...")
 
-        collection.delete_many({"_id": {"$ne": "metadata"}})
+        valid_products = []
+        for product in products:
+            if "url" not in product or not product["url"]:
+                print(f"[{parser_name}] ⚠️ Пропущен товар без 'url': {product}")
+                continue
+            valid_products.append(product)
+
+        stored_hashes, stored_hashes_all, stored_prices = self._load_store_hashes(parser_name)
+
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        changed_documents = []
+        change_events = []
+        bulk_operations, bulk_operations_all = self._diff_operations(
+            parser_name, valid_products, stored_hashes, stored_hashes_all, counts,
+            changed_documents, change_events, stored_prices
+        )
 
+        seen_ids = {product["url"] for product in valid_products}
+        removed_ids = self._append_deletes(
+            parser_name, bulk_operations, bulk_operations_all, stored_hashes, stored_hashes_all, seen_ids
+        )
+        change_events.extend(removed_event(parser_name, url) for url in removed_ids)
+
+        try:
+            if bulk_operations:
+                collection.bulk_write(bulk_operations, ordered=False)
+            if bulk_operations_all:
+                result_all = all_products_collection.bulk_write(bulk_operations_all, ordered=False)
+                print(f"[all_products] MongoDB результат: {result_all.bulk_api_result}")
+        except BulkWriteError as e:
+            print(f"[{parser_name}] ❌ Ошибка массовой записи: {e.details}")
+            return False
+
+        # Хэш фиксируется только после успешной записи, иначе следующий запуск повторит её
         collection.update_one(
             {"_id": "metadata"},
             {"$set": {"hash": overall_hash, "updated_at": datetime.utcnow()}},
             upsert=True
         )
 
-        bulk_operations = []
-        bulk_operations_all = []
+        print(
+            f"[{parser_name}] ✅ Обновлено {counts['updated']}, добавлено {counts['inserted']}, "
+            f"удалено {len(removed_ids)}, без изменений {counts['unchanged']} товаров."
+        )
+        self._record_history(parser_name, changed_documents, removed_ids, store_snapshot=True)
+        self._record_changes(parser_name, change_events)
+        self._catalog_changed(parser_name)
+        return True
 
-        updated_count = 0
-        inserted_count = 0
+    async def save_product_stream(self, parser_name: str, products, started_at: float = None,
+                                  chunk_size: int = SAVE_CHUNK_SIZE) -> dict:
+        """
+        Потоковое сохранение: товары из асинхронного генератора парсера пишутся
+        пачками по chunk_size, пока обход ещё идёт. Как и в save_products, в БД
+        уходят только новые и изменённые товары; в конце удаляются товары,
+        которых в этом запуске не было, и обновляется хэш в metadata.
+        started_at — time.perf_counter() начала обхода, для замера задержки до первой записи.
+        """
+        started_at = started_at or time.perf_counter()
+        stats = {
+            "written": 0, "inserted": 0, "updated": 0, "unchanged": 0, "removed": 0, "operations": 0,
+            "chunks": 0, "failed_chunks": 0,
+            "first_write_latency": None, "total_latency": None,
+        }
 
-        for product in products:
+        stored_hashes, stored_hashes_all, stored_prices = await asyncio.to_thread(
+            self._load_store_hashes, parser_name
+        )
+        seen_ids = set()
+
+        # Хэш каталога считается по мере поступления товаров, без накопления списка
+        hasher = CatalogHasher()
+        chunk = []
+
+        async def flush():
+            await asyncio.to_thread(
+                self._write_chunk, parser_name, chunk, stored_hashes, stored_hashes_all, stored_prices, stats,
+                started_at
+            )
+            chunk.clear()
+
+        async for product in products:
             if "url" not in product or not product["url"]:
                 print(f"[{parser_name}] ⚠️ Пропущен товар без 'url': {product}")
                 continue
 
-            product["_id"] = product["url"]
-            product["updated_at"] = datetime.utcnow()
+            hasher.update(product)
+
+            seen_ids.add(product["url"])
+            chunk.append(product)
+            if len(chunk) >= chunk_size:
+                await flush()
+
+        if chunk:
+            await flush()
+
+        if not stats["written"]:
+            print(f"[{parser_name}] ❌ Парсер не вернул товаров. Сохранённые данные не трогаем.")
+            return stats
+        if stats["failed_chunks"]:
+            # Часть товаров не записана — не удаляем «пропавшие» и не обновляем хэш
+            print(f"[{parser_name}] ❌ Не записано пачек: {stats['failed_chunks']}. Очистка пропущена.")
+            if stats["operations"]:
+                # Записанные пачки уже изменили каталог: сводка, снимок и кэш ответов должны это увидеть
+                await asyncio.to_thread(self._catalog_changed, parser_name)
+            return stats
+
+        overall_hash = hasher.hexdigest()
+        stats["removed"] = await asyncio.to_thread(
+            self._finish_stream, parser_name, overall_hash, stored_hashes, stored_hashes_all, seen_ids,
+            stats["operations"]
+        )
+
+        stats["total_latency"] = round(time.perf_counter() - started_at, 3)
+        print(
+            f"[{parser_name}] ✅ Обработано {stats['written']} товаров: новых {stats['inserted']}, "
+            f"изменённых {stats['updated']}, без изменений {stats['unchanged']}, удалено {stats['removed']}; "
+            f"пачками: {stats['chunks']}, всего {stats['total_latency']} с"
+        )
+        return stats
 
-            if collection.find_one({"_id": product["_id"]}):
-                updated_count += 1
+    @staticmethod
+    def _load_content_hashes(collection: Collection, query: dict, prices: dict = None) -> dict:
+        """
+        _id → content_hash сохранённых документов (одним запросом, только нужные поля).
+        Если передан prices, в него записываются _id → price_value.
+        """
+        projection = {"content_hash": 1, "price_value": 1} if prices is not None else {"content_hash": 1}
+        hashes = {}
+        for doc in collection.find(query, projection):
+            hashes[doc["_id"]] = doc.get("content_hash")
+            if prices is not None:
+                prices[doc["_id"]] = doc.get("price_value")
+        return hashes
+
+    def _load_store_hashes(self, parser_name: str):
+        """
+        Хэши и цены коллекции магазина и хэши его строк в all_products
+        (None, если all_products не ведётся).
+        """
+        stored_prices = {}
+        stored_hashes = self._load_content_hashes(
+            self.db[f"{parser_name}_products"], {"_id": {"$ne": "metadata"}}, stored_prices
+        )
+        stored_hashes_all = None
+        if self.write_all_products:
+            stored_hashes_all = self._load_content_hashes(self.db["all_products"], store_filter(parser_name))
+        return stored_hashes, stored_hashes_all, stored_prices
+
+    @staticmethod
+    def _diff_operations(parser_name: str, products: list[dict], stored_hashes: dict,
+                         stored_hashes_all: dict, counts: dict, changed_documents: list = None,
+                         change_events: list = None, stored_prices: dict = None):
+        """
+        Операции записи для товаров, которые отличаются от сохранённых: InsertOne
+        для новых и ReplaceOne для изменённых. stored_hashes обновляются на месте,
+        поэтому повтор того же url дальше в потоке не приведёт к повторной вставке.
+        Обе коллекции сверяются со своими хэшами независимо; при stored_hashes_all=None
+        строки all_products не формируются. Новые и изменённые документы
+        добавляются в changed_documents (для истории цен), события о них —
+        в change_events (для ленты изменений, по ценам из stored_prices).
+        """
+        bulk_operations = []
+        bulk_operations_all = []
+        now = datetime.utcnow()
+
+        for product in products:
+            content_hash = calculate_product_hash(product)
+            document = {k: v for k, v in product.items() if k not in HASH_EXCLUDED_FIELDS}
+            document.update(numeric_fields(product))
+            document.update(_id=product["url"], updated_at=now, content_hash=content_hash)
+
+            if document["_id"] not in stored_hashes:
+                bulk_operations.append(InsertOne(document))
+                counts["inserted"] += 1
+            elif stored_hashes[document["_id"]] != content_hash:
+                bulk_operations.append(ReplaceOne({"_id": document["_id"]}, document))
+                counts["updated"] += 1
             else:
-                inserted_count += 1
+                counts["unchanged"] += 1
+            if stored_hashes.get(document["_id"]) != content_hash:
+                if changed_documents is not None:
+                    changed_documents.append(document)
+                if change_events is not None:
+                    is_new = document["_id"] not in stored_hashes
+                    previous_price = stored_prices.get(document["_id"]) if stored_prices is not None else None
+                    change_events.append(product_event(parser_name, document, is_new, previous_price))
+            stored_hashes[document["_id"]] = content_hash
+            if stored_prices is not None:
+                stored_prices[document["_id"]] = document["price_value"]
 
-            bulk_operations.append(
-                ReplaceOne({"_id": product["_id"]}, product, upsert=True)
-            )
+            if stored_hashes_all is None:
+                continue
+            document_all = dict(document, _id=f"{parser_name}_{product['url']}", source=parser_name)
+            if document_all["_id"] not in stored_hashes_all:
+                bulk_operations_all.append(InsertOne(document_all))
+            elif stored_hashes_all[document_all["_id"]] != content_hash:
+                bulk_operations_all.append(ReplaceOne({"_id": document_all["_id"]}, document_all))
+            stored_hashes_all[document_all["_id"]] = content_hash
 
-            product_copy = product.copy()
-            product_copy["_id"] = f"{parser_name}_{product['url']}"
-            product_copy["source"] = parser_name
-            bulk_operations_all.append(
-                ReplaceOne({"_id": product_copy["_id"]}, product_copy, upsert=True)
-            )
+        return bulk_operations, bulk_operations_all
 
+    @staticmethod
+    def _append_deletes(parser_name: str, bulk_operations: list, bulk_operations_all: list,
+                        stored_hashes: dict, stored_hashes_all: dict, seen_ids: set) -> list:
+        """Добавляет удаление товаров, которых больше нет в магазине; возвращает их url."""
+        vanished_ids = [product_id for product_id in stored_hashes if product_id not in seen_ids]
+        if vanished_ids:
+            bulk_operations.append(DeleteMany({"_id": {"$in": vanished_ids}}))
+
+        if stored_hashes_all is None:
+            return vanished_ids
+        seen_ids_all = {f"{parser_name}_{product_id}" for product_id in seen_ids}
+        vanished_ids_all = [product_id for product_id in stored_hashes_all if product_id not in seen_ids_all]
+        if vanished_ids_all:
+            bulk_operations_all.append(DeleteMany({"_id": {"$in": vanished_ids_all}}))
+
+        return vanished_ids
+
+    def _write_chunk(self, parser_name: str, chunk: list[dict], stored_hashes: dict,
+                     stored_hashes_all: dict, stored_prices: dict, stats: dict, started_at: float):
+        """
+        Пишет отличия пачки от сохранённого каталога. first_write_latency
+        фиксируется после первого выполненного bulk_write: пачки без изменений
+        и неудачные записи в замер не попадают.
+        """
+        collection: Collection = self.db[f"{parser_name}_products"]
+        all_products_collection: Collection = self.db["all_products"]
+
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        changed_documents = []
+        change_events = []
+        bulk_operations, bulk_operations_all = self._diff_operations(
+            parser_name, chunk, stored_hashes, stored_hashes_all, counts,
+            changed_documents, change_events, stored_prices
+        )
+
+        written_operations = 0
         try:
             if bulk_operations:
-                result = collection.bulk_write(bulk_operations)
-                print(f"[{parser_name}] ✅ Обновлено {updated_count}, добавлено {inserted_count} товаров.")
-
+                collection.bulk_write(bulk_operations, ordered=False)
+                written_operations += len(bulk_operations)
+                self._mark_first_write(parser_name, stats, started_at)
             if bulk_operations_all:
-                # Удаляем старые товары этого парсера в общей коллекции
-                all_products_collection.delete_many({"source": parser_name})
-                result_all = all_products_collection.bulk_write(bulk_operations_all)
-                print(f"[all_products] ✅ Записано {len(bulk_operations_all)} товаров из {parser_name}.")
-                print(f"[all_products] MongoDB результат: {result_all.bulk_api_result}")
-
+                all_products_collection.bulk_write(bulk_operations_all, ordered=False)
+                written_operations += len(bulk_operations_all)
+                self._mark_first_write(parser_name, stats, started_at)
         except BulkWriteError as e:
             print(f"[{parser_name}] ❌ Ошибка массовой записи: {e.details}")
-            return False
+            stats["failed_chunks"] += 1
+            # Неупорядоченная запись могла выполнить часть операций до ошибки
+            stats["operations"] += written_operations + e.details.get("nInserted", 0) + e.details.get("nModified", 0)
+            return
 
-        return True
+        stats["written"] += len(chunk)
+        stats["operations"] += written_operations
+        for key, value in counts.items():
+            stats[key] += value
+        stats["chunks"] += 1
+        self._record_history(parser_name, changed_documents)
+        self._record_changes(parser_name, change_events)
+
+    @staticmethod
+    def _mark_first_write(parser_name: str, stats: dict, started_at: float):
+        if stats["first_write_latency"] is None:
+            stats["first_write_latency"] = round(time.perf_counter() - started_at, 3)
+            logger.info(f"[{parser_name}] ⏱️ Первая запись в БД через {stats['first_write_latency']} с после старта обхода")
+
+    def _finish_stream(self, parser_name: str, overall_hash: str, stored_hashes: dict,
+                       stored_hashes_all: dict, seen_ids: set, operations: int = 0) -> int:
+        """
+        Удаляет товары, пропавшие из магазина, и сохраняет хэш каталога.
+        operations — сколько вставок и замен сделали пачки; если их и удалений
+        не было, а хэш в metadata совпадает, каталог не менялся: metadata не
+        переписывается, сводка, снимок и кэш ответов не сбрасываются.
+        """
+        collection: Collection = self.db[f"{parser_name}_products"]
+        all_products_collection: Collection = self.db["all_products"]
+
+        bulk_operations, bulk_operations_all = [], []
+        removed_ids = self._append_deletes(
+            parser_name, bulk_operations, bulk_operations_all, stored_hashes, stored_hashes_all, seen_ids
+        )
+
+        metadata = collection.find_one({"_id": "metadata"})
+        if not operations and not bulk_operations and not bulk_operations_all \
+                and metadata and metadata.get("hash") == overall_hash:
+            print(f"[{parser_name}] ℹ️ Хэш не изменился. Обновление не требуется.")
+            return 0
+        if bulk_operations:
+            collection.bulk_write(bulk_operations, ordered=False)
+        if bulk_operations_all:
+            all_products_collection.bulk_write(bulk_operations_all, ordered=False)
+        if removed_ids:
+            print(f"[{parser_name}] 🗑️ Удалено пропавших товаров: {len(removed_ids)}")
+
+        collection.update_one(
+            {"_id": "metadata"},
+            {"$set": {"hash": overall_hash, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        self._record_history(parser_name, [], removed_ids, store_snapshot=True)
+        self._record_changes(parser_name, [removed_event(parser_name, url) for url in removed_ids])
+        self._catalog_changed(parser_name)
+        return len(removed_ids)
+
+    def _record_history(self, parser_name: str, changed_documents: list[dict], removed_ids: list = (),
+                        store_snapshot: bool = False):
+        """История цен: строки изменившихся товаров и (в конце сохранения) срез цен магазина."""
+        try:
+            record_product_changes(self.db, parser_name, changed_documents, removed_ids)
+            if store_snapshot:
+                record_store_prices(self.db, parser_name)
+        except Exception as e:
+            print(f"[{parser_name}] ❌ Не удалось записать историю цен: {e}")
+
+    def _record_changes(self, parser_name: str, change_events: list[dict]):
+        """Лента изменений каталога для потребителей, которые ведут свою копию."""
+        try:
+            record_catalog_changes(self.db, change_events)
+        except Exception as e:
+            print(f"[{parser_name}] ❌ Не удалось записать ленту изменений: {e}")
+
+    def _catalog_changed(self, parser_name: str):
+        """
+        После записи нового хэша магазина: обновляет сводку и снимок общего
+        каталога, если он ведётся по месту (в режиме versioned — при публикации),
+        и только затем сбрасывает кэш ответов API, чтобы в него не попали старые данные.
+        """
+        if self.write_all_products:
+            catalog = get_catalog_collection(self.db)
+            try:
+                refresh_catalog_stats(self.db, catalog)
+            except Exception as e:
+                print(f"[catalog_stats] ❌ Не удалось обновить сводку каталога: {e}")
+            try:
+                refresh_catalog_index(catalog)
+            except Exception as e:
+                print(f"[catalog_index] ❌ Не удалось обновить снимок каталога: {e}")
+        invalidate_catalog_cache(parser_name)
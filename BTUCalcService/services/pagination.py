@@ -0,0 +1,147 @@
+import base64
+import json
+import re
+from pymongo import ASCENDING, DESCENDING
+from services.catalog_stats import NUMERIC_FIELDS
+
+# Поля, по которым можно сортировать списки товаров (при равенстве — по _id)
+SORT_FIELDS = {"_id", "btu_value", "price_value", "service_area_value"}
+
+# Служебные поля товара, которые наружу не отдаются: хэш и отпечаток карточки
+# для сохранения, числовые копии btu/price/service_area для фильтров и сортировки
+HIDDEN_FIELDS = {"_id", "content_hash", "listing_signature", *NUMERIC_FIELDS.values()}
+
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class PageQuery:
+    """
+    Параметры списка товаров: сортировка, курсор after, limit и набор полей.
+    Курсор — непрозрачная строка со значением поля сортировки и _id последнего
+    отданного товара; следующая страница выбирается условием «после него»
+    (keyset), без skip, поэтому её стоимость не растёт с номером страницы.
+    nulls_last — товары без значения поля идут в конце и при сортировке по
+    возрастанию (в MongoDB null сортируется раньше чисел).
+    Ошибки в параметрах — ValueError.
+    """
+
+    def __init__(self, sort: str, after: str = None, limit: int = None, fields: str = None, nulls_last: bool = False):
+        self.direction = DESCENDING if sort.startswith("-") else ASCENDING
+        self.sort_field = sort.lstrip("-")
+        if self.sort_field not in SORT_FIELDS:
+            raise ValueError(f"Сортировка возможна только по полям: {', '.join(sorted(SORT_FIELDS))}")
+        # По убыванию null и так последний, у _id значений null нет
+        self.nulls_last = nulls_last and self.direction == ASCENDING and self.sort_field != "_id"
+
+        self.after = decode_cursor(after) if after else None
+        self.limit = limit
+        self.fields = parse_fields(fields)
+
+    def filter(self, query: dict) -> dict:
+        """Фильтр эндпоинта с условием «после курсора»."""
+        if self.after is None:
+            return query
+        return {"$and": [query, keyset_filter(self.sort_field, self.direction, *self.after)]}
+
+    def queries(self, query: dict) -> list[tuple[dict, list]]:
+        """
+        Фильтры и сортировки запросов страницы в порядке выдачи. Обычно запрос один;
+        при nulls_last товары без значения читаются вторым запросом, после остальных,
+        чтобы обе части шли по индексу.
+        """
+        if not self.nulls_last:
+            return [(self.filter(query), self.sort())]
+
+        field = self.sort_field
+        with_value = [query, {field: {"$ne": None}}]
+        without_value = [query, {field: None}]
+        if self.after is not None:
+            value, document_id = self.after
+            if value is None:
+                return [({"$and": [*without_value, {"_id": {"$gt": document_id}}]}, self.sort())]
+            with_value.append(keyset_filter(field, ASCENDING, value, document_id))
+        return [({"$and": with_value}, self.sort()), ({"$and": without_value}, self.sort())]
+
+    def pipeline(self, query: dict) -> list:
+        """Те же товары страницы в порядке выдачи стадиями агрегации (для $facet)."""
+        queries = self.queries(query)
+        stages = [{"$match": queries[0][0] if len(queries) == 1 else {"$or": [match for match, _ in queries]}}]
+        sort = dict(self.sort())
+        if self.nulls_last:
+            stages.append({"$addFields": {"_no_value": {"$eq": [{"$ifNull": [f"${self.sort_field}", None]}, None]}}})
+            sort = {"_no_value": 1, **sort}
+        stages.append({"$sort": sort})
+        if self.limit:
+            stages.append({"$limit": self.limit + 1})
+        projection = self.projection()
+        if self.nulls_last and not self.fields:
+            # Исключающая проекция сама не уберёт служебный ключ сортировки
+            projection["_no_value"] = 0
+        stages.append({"$project": projection})
+        return stages
+
+    def sort(self) -> list:
+        if self.sort_field == "_id":
+            return [("_id", self.direction)]
+        return [(self.sort_field, self.direction), ("_id", self.direction)]
+
+    def projection(self) -> dict:
+        """Запрошенные поля плюс _id и поле сортировки, нужные для курсора (без запроса — всё, кроме служебных)."""
+        if not self.fields:
+            return {field: 0 for field in HIDDEN_FIELDS - {"_id", self.sort_field}}
+        return {field: 1 for field in {*self.fields, "_id", self.sort_field}}
+
+    def cursor_for(self, document: dict) -> str:
+        return encode_cursor(document.get(self.sort_field) if self.sort_field != "_id" else None, document["_id"])
+
+    def clean(self, document: dict) -> dict:
+        """Убирает служебные поля и поля, добавленные только ради курсора."""
+        if self.fields:
+            return {k: v for k, v in document.items() if k in self.fields and k not in HIDDEN_FIELDS}
+        return {k: v for k, v in document.items() if k not in HIDDEN_FIELDS}
+
+
+def parse_fields(fields: str) -> set:
+    if not fields:
+        return set()
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    invalid = [name for name in names if not FIELD_NAME.match(name) or name in HIDDEN_FIELDS]
+    if invalid:
+        raise ValueError(f"Недопустимые поля: {', '.join(sorted(invalid))}")
+    return names
+
+
+def encode_cursor(value, document_id) -> str:
+    raw = json.dumps([value, document_id], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, document_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Некорректный курсор after")
+    return value, document_id
+
+
+def keyset_filter(field: str, direction: int, value, document_id) -> dict:
+    """
+    Условие «после (value, document_id)» в порядке сортировки (field, _id).
+    null в MongoDB сортируется раньше чисел: при возрастании товары без значения
+    идут первыми, при убывании — последними.
+    """
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if field == "_id":
+        return {"_id": {op: document_id}}
+
+    same_value = {field: value, "_id": {op: document_id}}
+    if value is None:
+        if direction == ASCENDING:
+            return {"$or": [same_value, {field: {"$ne": None}}]}
+        return same_value
+
+    conditions = [{field: {op: value}}, same_value]
+    if direction == DESCENDING:
+        conditions.append({field: None})
+    return {"$or": conditions}
@@ -0,0 +1,42 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Число процессов для разбора HTML; 0 — разбирать прямо в event loop (для отладки)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+
+_pool = None
+
+
+def get_parse_pool():
+    """
+    Пул процессов для разбора HTML. Используется spawn, а не fork: в процессе
+    сервиса уже работают потоки APScheduler и pymongo.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def run_in_parse_pool(func, *args):
+    """
+    Выполняет синхронную функцию разбора в пуле процессов и возвращает её результат.
+    func должна быть функцией уровня модуля или staticmethod, а результат — простыми
+    dict/list, чтобы их можно было передать между процессами.
+    """
+    if PARSE_WORKERS <= 0:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_parse_pool(), func, *args)
+
+
+def shutdown_parse_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,173 @@
+import os
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+from pymongo.database import Database
+from pymongo.errors import CollectionInvalid
+
+# Сколько дней хранить исходные записи истории (свёртки по часам и дням не удаляются)
+PRICE_HISTORY_TTL_DAYS = int(os.getenv("PRICE_HISTORY_TTL_DAYS", "400"))
+
+# Time-series: изменения товаров (meta: store, url) и срезы цен по магазинам (meta: store)
+PRICE_HISTORY = "price_history"
+STORE_PRICES = "store_prices"
+ROLLUP_STATE = "price_history_state"
+
+ROLLUP_UNITS = ("hour", "day")
+
+# Свёртки: исходная коллекция → (поля группировки из meta, накопители, префикс целевых коллекций)
+ROLLUPS = {
+    PRICE_HISTORY: (
+        ("store", "url"),
+        {
+            "price_min": {"$min": "$price_value"},
+            "price_max": {"$max": "$price_value"},
+            "price_avg": {"$avg": "$price_value"},
+            "price_last": {"$last": "$price_value"},
+            "btu_last": {"$last": "$btu_value"},
+            "available_last": {"$last": "$available"},
+            "samples": {"$sum": 1},
+        },
+        "price_history",
+    ),
+    STORE_PRICES: (
+        ("store",),
+        {
+            "avg_price": {"$avg": "$avg_price"},
+            "min_price": {"$min": "$min_price"},
+            "max_price": {"$max": "$max_price"},
+            "products": {"$last": "$products"},
+            "samples": {"$sum": 1},
+        },
+        "store_prices",
+    ),
+}
+
+_prepared = set()
+
+
+def rollup_collection(source: str, unit: str) -> str:
+    """Имя коллекции свёртки, например price_history_daily."""
+    return f"{ROLLUPS[source][2]}_{'hourly' if unit == 'hour' else 'daily'}"
+
+
+def ensure_price_history(db: Database):
+    """Создаёт time-series коллекции и уникальные индексы свёрток (один раз на процесс)."""
+    if db.name in _prepared:
+        return
+
+    for name in (PRICE_HISTORY, STORE_PRICES):
+        try:
+            db.create_collection(
+                name,
+                timeseries={"timeField": "ts", "metaField": "meta", "granularity": "hours"},
+                expireAfterSeconds=PRICE_HISTORY_TTL_DAYS * 24 * 3600,
+            )
+            print(f"[history] ✅ Создана time-series коллекция {name}")
+        except CollectionInvalid:
+            pass
+
+    db[PRICE_HISTORY].create_index([("meta.url", ASCENDING), ("ts", ASCENDING)])
+    db[STORE_PRICES].create_index([("meta.store", ASCENDING), ("ts", ASCENDING)])
+
+    for source, (key_fields, _, _) in ROLLUPS.items():
+        for unit in ROLLUP_UNITS:
+            # $merge по этим полям требует уникального индекса
+            keys = [(field, ASCENDING) for field in key_fields] + [("bucket", ASCENDING)]
+            db[rollup_collection(source, unit)].create_index(keys, unique=True)
+
+    _prepared.add(db.name)
+
+
+def record_product_changes(db: Database, store: str, documents: list[dict], removed_urls: list[str] = ()):
+    """Добавляет по записи на каждый новый, изменённый и пропавший товар этого обхода."""
+    if not documents and not removed_urls:
+        return
+    ensure_price_history(db)
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "ts": now,
+            "meta": {"store": store, "url": document["url"]},
+            "price_value": document.get("price_value"),
+            "btu_value": document.get("btu_value"),
+            "available": True,
+        }
+        for document in documents
+    ]
+    rows.extend(
+        {
+            "ts": now,
+            "meta": {"store": store, "url": url},
+            "price_value": None,
+            "btu_value": None,
+            "available": False,
+        }
+        for url in removed_urls
+    )
+    db[PRICE_HISTORY].insert_many(rows, ordered=False)
+
+
+def record_store_prices(db: Database, store: str):
+    """Срез цен магазина после сохранения: средняя, минимальная, максимальная цена и число товаров."""
+    ensure_price_history(db)
+
+    summary = next(db[f"{store}_products"].aggregate([
+        {"$match": {"_id": {"$ne": "metadata"}, "price_value": {"$ne": None}}},
+        {"$group": {
+            "_id": None,
+            "avg_price": {"$avg": "$price_value"},
+            "min_price": {"$min": "$price_value"},
+            "max_price": {"$max": "$price_value"},
+            "products": {"$sum": 1},
+        }},
+    ]), None)
+    if not summary:
+        return
+
+    summary.pop("_id")
+    db[STORE_PRICES].insert_one(dict(summary, ts=datetime.utcnow(), meta={"store": store}))
+
+
+def rollup_price_history(db: Database):
+    """
+    Досчитывает свёртки по часам и дням через $merge. Обрабатываются только записи
+    с начала периода, в котором остановилась прошлая свёртка, поэтому незавершённый
+    час/день пересчитывается целиком, а старые периоды не трогаются.
+    """
+    ensure_price_history(db)
+    state = db[ROLLUP_STATE]
+    started_at = datetime.utcnow()
+
+    for source, (key_fields, accumulators, _) in ROLLUPS.items():
+        for unit in ROLLUP_UNITS:
+            target = rollup_collection(source, unit)
+            watermark = state.find_one({"_id": target})
+            since = watermark["rolled_up_to"] if watermark else datetime.min
+
+            group_id = {field: f"$meta.{field}" for field in key_fields}
+            group_id["bucket"] = {"$dateTrunc": {"date": "$ts", "unit": unit}}
+            db[source].aggregate([
+                {"$match": {"ts": {"$gte": _truncate(since, unit)}}},
+                {"$sort": {"ts": 1}},
+                {"$group": {"_id": group_id, **accumulators}},
+                {"$replaceWith": {"$mergeObjects": ["$_id", {k: f"${k}" for k in accumulators}]}},
+                {"$merge": {
+                    "into": target,
+                    "on": [*key_fields, "bucket"],
+                    "whenMatched": "merge",
+                    "whenNotMatched": "insert",
+                }},
+            ])
+            state.update_one({"_id": target}, {"$set": {"rolled_up_to": started_at}}, upsert=True)
+
+
+def _truncate(moment: datetime, unit: str) -> datetime:
+    if moment == datetime.min:
+        return moment
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if unit == "day" else moment
+
+
+def history_since(days: int) -> datetime:
+    return datetime.utcnow() - timedelta(days=days)
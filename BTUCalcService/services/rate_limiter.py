@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Начальная и предельная скорость запросов к одному сайту (запросов в секунду)
+RATE_LIMIT_INITIAL_RPS = float(os.getenv("RATE_LIMIT_INITIAL_RPS", "4"))
+RATE_LIMIT_MIN_RPS = float(os.getenv("RATE_LIMIT_MIN_RPS", "0.5"))
+RATE_LIMIT_MAX_RPS = float(os.getenv("RATE_LIMIT_MAX_RPS", "20"))
+# Начальное и предельное число одновременных запросов к одному сайту.
+# Ограничитель — единственный регулятор параллелизма: окно задач парсеров
+# и пул соединений на хост рассчитаны на RATE_LIMIT_MAX_CONCURRENCY
+RATE_LIMIT_INITIAL_CONCURRENCY = int(os.getenv("RATE_LIMIT_INITIAL_CONCURRENCY", "4"))
+RATE_LIMIT_MAX_CONCURRENCY = int(os.getenv("RATE_LIMIT_MAX_CONCURRENCY", "16"))
+
+_limiters = {}
+
+
+class HostLimiter:
+    """
+    Ограничитель запросов к одному хосту: token bucket по скорости и окно
+    одновременных запросов. Оба параметра регулируются по AIMD: после каждого
+    успешного ответа немного растут, а при 429/5xx/тайм-ауте уменьшаются вдвое.
+    Окно растёт не выше max_concurrency (для чувствительных сайтов парсер задаёт меньше).
+    """
+
+    # Прирост за один успешный ответ и множитель при перегрузке
+    rate_step = 0.1
+    concurrency_step = 0.1
+    backoff_factor = 0.5
+    # Несколько ошибок подряд от одной перегрузки снижают темп только один раз
+    decrease_cooldown = 2.0
+
+    def __init__(self, host: str, max_concurrency: int = RATE_LIMIT_MAX_CONCURRENCY):
+        self.host = host
+        self.rate = RATE_LIMIT_INITIAL_RPS
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(min(RATE_LIMIT_INITIAL_CONCURRENCY, max_concurrency))
+        self.tokens = 1.0
+        self.updated_at = time.monotonic()
+        self.in_flight = 0
+        # Раньше этого момента запросы не отправляются (пауза по Retry-After)
+        self.paused_until = 0.0
+        self.decreased_at = 0.0
+        self.loop = asyncio.get_running_loop()
+        self.condition = asyncio.Condition()
+
+        self.requests = 0
+        self.throttled = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self.condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    delay = None
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    self.requests += 1
+                    return
+                else:
+                    delay = (1 - self.tokens) / self.rate
+
+                try:
+                    await asyncio.wait_for(self.condition.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    def on_success(self):
+        """Аддитивное увеличение: сайт отвечает нормально."""
+        self.rate = min(RATE_LIMIT_MAX_RPS, self.rate + self.rate_step)
+        self.concurrency = min(self.max_concurrency, self.concurrency + self.concurrency_step)
+
+    def on_throttle(self, retry_after: float = None):
+        """Мультипликативное уменьшение: сайт перегружен или просит подождать."""
+        self.throttled += 1
+        now = time.monotonic()
+        if now - self.decreased_at >= self.decrease_cooldown:
+            self.decreased_at = now
+            self.rate = max(RATE_LIMIT_MIN_RPS, self.rate * self.backoff_factor)
+            self.concurrency = max(1.0, self.concurrency * self.backoff_factor)
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "rate_rps": round(self.rate, 2),
+            "concurrency": int(self.concurrency),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "throttled": self.throttled,
+        }
+
+
+def get_host_limiter(url: str, max_concurrency: int = RATE_LIMIT_MAX_CONCURRENCY) -> HostLimiter:
+    """Общий для процесса ограничитель хоста, к которому относится url."""
+    host = urlsplit(url).netloc
+    limiter = _limiters.get(host)
+    if limiter is None or limiter.loop is not asyncio.get_running_loop():
+        previous = limiter
+        limiter = _limiters[host] = HostLimiter(host, max_concurrency)
+        if previous:
+            # Новый event loop (например, отдельный запуск скрипта) — сохраняем подобранные параметры
+            limiter.rate = previous.rate
+            limiter.concurrency = min(previous.concurrency, float(max_concurrency))
+    elif limiter.max_concurrency != max_concurrency:
+        limiter.max_concurrency = max_concurrency
+        limiter.concurrency = min(limiter.concurrency, float(max_concurrency))
+    return limiter
+
+
+def parse_retry_after(value):
+    """Значение заголовка Retry-After в секундах (число секунд или HTTP-дата)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def get_rate_limiter_stats() -> dict:
+    return {host: limiter.stats() for host, limiter in _limiters.items()}
@@ -1,15 +1,52 @@
 import http from 'k6/http';
 import { sleep, check } from 'k6';
+import exec from 'k6/execution';
 
+// Сценарий calculate_btu — прежняя постоянная нагрузка на расчёт.
+// Сценарий products — чтение каталога со ступенчатым ростом числа пользователей:
+// при неблокирующем доступе к MongoDB запросы/сек должны расти вместе с числом VU,
+// а p(95) оставаться примерно на одном уровне (смотреть http_reqs и
+// http_req_duration с тегом stage в отчёте).
 export let options = {
-  vus: 30, // виртуальных пользователей
-  duration: '1m', // время теста
+  scenarios: {
+    calculate_btu: {
+      executor: 'constant-vus',
+      exec: 'calculateBtu',
+      vus: 30, // виртуальных пользователей
+      duration: '1m', // время теста
+    },
+    products: {
+      executor: 'ramping-vus',
+      exec: 'readProducts',
+      startVUs: 1,
+      stages: [
+        { duration: '20s', target: 10 },
+        { duration: '40s', target: 10 },
+        { duration: '20s', target: 50 },
+        { duration: '40s', target: 50 },
+        { duration: '20s', target: 100 },
+        { duration: '40s', target: 100 },
+      ],
+    },
+  },
+  thresholds: {
+    'http_req_duration{scenario:products}': ['p(95)<500'],
+    'checks{scenario:products}': ['rate>0.99'],
+    // Пороги по ступеням нужны, чтобы k6 вывел метрики каждой ступени отдельно
+    'http_reqs{stage:vus_10}': ['count>0'],
+    'http_reqs{stage:vus_50}': ['count>0'],
+    'http_reqs{stage:vus_100}': ['count>0'],
+    'http_req_duration{stage:vus_10}': ['p(95)<500'],
+    'http_req_duration{stage:vus_50}': ['p(95)<500'],
+    'http_req_duration{stage:vus_100}': ['p(95)<500'],
+  },
 };
 
 const BASE_URL = 'http://btu-calc-service:8000'; // имя из docker-compose (если изнутри Docker)
 const endpoint = '/BTUCalcService/calculate_btu';
+const PRODUCTS_URL = `${BASE_URL}/BTUCalcService/products`;
 
-export default function () {
+export function calculateBtu() {
   const payload = JSON.stringify({
     room_size: 20,
     size_unit: "square meters",
@@ -41,3 +78,49 @@ export default function () {
 
   sleep(1);
 }
+
+// Ступень нагрузки по времени от начала сценария products — для разбивки метрик в отчёте
+function stageTag() {
+  const elapsed = (Date.now() - exec.scenario.startTime) / 1000;
+  if (elapsed < 60) return 'vus_10';
+  if (elapsed < 120) return 'vus_50';
+  return 'vus_100';
+}
+
+export function readProducts() {
+  const params = { tags: { stage: stageTag() } };
+
+  const responses = http.batch([
+    ['GET', `${PRODUCTS_URL}/range/?btu_min=9000&btu_max=12000`, null, params],
+    ['GET', `${PRODUCTS_URL}/btu/12000`, null, params],
+    ['GET', `${PRODUCTS_URL}/price/?price_min=5000&price_max=15000`, null, params],
+    ['GET', `${PRODUCTS_URL}/service_area/25`, null, params],
+  ]);
+
+  responses.forEach((res) => {
+    check(res, {
+      '📦 Каталог отвечает (200/404)': (r) => r.status === 200 || r.status === 404,
+    });
+  });
+
+  checkSearchOrder(params);
+
+  sleep(0.1);
+}
+
+// Поиск по умолчанию сортирует по цене: товары без цены должны идти после всех товаров с ценой
+function checkSearchOrder(params) {
+  const res = http.get(`${PRODUCTS_URL}/search?btu_min=0&limit=200`, params);
+
+  check(res, {
+    '🔢 Поиск: товары без цены в конце': (r) => {
+      if (r.status === 404) return true;
+      if (r.status !== 200) return false;
+      const priced = r.json().map((product) => product.price !== null && product.price !== undefined && product.price !== '');
+      const firstUnpriced = priced.indexOf(false);
+      return firstUnpriced === -1 || priced.slice(firstUnpriced).every((hasPrice) => !hasPrice);
+    },
+  });
+}
+
+export default calculateBtu;